@@ -0,0 +1,221 @@
+"""Benchmark of document indexing after each parse.
+
+Compares the single iterative walk in `_index_wdl` with the previous
+recursive walks (types, links, symbols, hovers and completion scopes),
+on generated workflows with many tasks and deeply nested scatters.
+
+Usage: python benchmarks/bench_index.py [--tasks N] [--depth D] [--repeat R]
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from timeit import repeat
+from typing import Dict, Iterable, List, Optional
+
+import WDL
+from lsprotocol.types import CompletionItem, CompletionItemKind
+from WDL import SourceNode, SourcePosition
+
+from wdl_lsp.server import (Scope, _add_decl, _completion, _get_members,
+                            _get_signature, _index_wdl)
+
+
+def generate_wdl(tasks: int, depth: int):
+    lines = ['version 1.0', '', 'struct Sample {', '  String name', '  File reads', '}', '']
+    for t in range(tasks):
+        lines += [
+            'task t{} {{'.format(t),
+            '  input {',
+            '    Sample s',
+            '    Int n = {}'.format(t),
+            '    Array[String] flags = []',
+            '  }',
+            '  command <<< echo ~{s.name} ~{n} ~{sep=" " flags} >>>',
+            '  output {',
+            '    Int out = n + 1',
+            '  }',
+            '}',
+            '',
+        ]
+    lines += ['workflow main {', '  input {', '    Array[Sample] samples', '  }']
+    for d in range(depth):
+        lines.append('  ' * (d + 1) + 'scatter (s{} in samples) {{'.format(d))
+    indent = '  ' * (depth + 1)
+    for t in range(tasks):
+        lines.append(indent + 'call t{0} {{ input: s = s{1}, n = {0} }}'.format(t, depth - 1))
+    for d in reversed(range(depth)):
+        lines.append('  ' * (d + 1) + '}')
+    lines += ['}', '']
+    return '\n'.join(lines)
+
+
+# previous implementation: one recursive walk per table
+
+
+def _get_types(nodes: Iterable[SourceNode], types: Dict[str, SourcePosition]):
+    for node in nodes:
+        if isinstance(node, WDL.Tree.StructTypeDef):
+            types[node.type_id] = node.pos
+        _get_types(node.children, types)
+    return types
+
+
+def _get_links(nodes: Iterable[SourceNode], types, defs, refs):
+    for node in nodes:
+        source: Optional[SourcePosition] = None
+        if isinstance(node, WDL.Tree.Call) and node.callee is not None:
+            source = node.callee.pos
+        elif isinstance(node, WDL.Tree.Decl) and isinstance(
+            node.type, WDL.Type.StructInstance
+        ):
+            source = types[node.type.type_id]
+        elif isinstance(node, WDL.Expr.Ident):
+            ref = node.referee
+            if isinstance(ref, WDL.Tree.Gather):
+                source = ref.final_referee.pos
+            else:
+                source = getattr(ref, 'pos', None)
+        if source is not None:
+            defs[node.pos] = source
+            refs.setdefault(source, []).append(node.pos)
+        _get_links(node.children, types, defs, refs)
+    return defs, refs
+
+
+def _get_symbols(nodes: Iterable[SourceNode], symbols: List[SourcePosition]):
+    for node in nodes:
+        symbols.append(node.pos)
+        _get_symbols(node.children, symbols)
+    return symbols
+
+
+def _get_hovers(nodes: Iterable[SourceNode], hovers: Dict[SourcePosition, str]):
+    for node in nodes:
+        hover: Optional[str] = None
+        if isinstance(node, WDL.Tree.Call) and node.callee is not None:
+            hover = _get_signature(node.callee)
+        elif isinstance(node, WDL.Tree.Decl):
+            hover = '{} {}'.format(node.type, node.name)
+        elif isinstance(node, WDL.Expr.Ident):
+            hover = '{} {}'.format(node.type, node.name)
+        elif isinstance(node, WDL.Expr.Get) and node.member is not None:
+            hover = '{} {}'.format(node.type, node.member)
+        if hover is not None:
+            hovers[node.pos] = hover
+        _get_hovers(node.children, hovers)
+    return hovers
+
+
+def _get_scopes(node: SourceNode, scopes: List[Scope]):
+    items: List[CompletionItem] = []
+    members: Dict[str, List[CompletionItem]] = dict()
+
+    if isinstance(node, WDL.Tree.Document):
+        for imp in node.imports:
+            items.append(CompletionItem(imp.namespace, kind=CompletionItemKind.Module))
+        for stb in node.struct_typedefs:
+            items.append(CompletionItem(str(stb.name), kind=CompletionItemKind.Struct))
+        for task in node.tasks:
+            items.append(CompletionItem(task.name, kind=CompletionItemKind.Function))
+        children = node.tasks + ([node.workflow] if node.workflow else [])
+    elif isinstance(node, WDL.Tree.Task):
+        for decl in (node.inputs or []) + node.postinputs + node.outputs:
+            _add_decl(decl, items, members)
+        children = []
+    elif isinstance(node, WDL.Tree.Workflow):
+        for decl in (node.inputs or []) + (node.outputs or []):
+            _add_decl(decl, items, members)
+        _add_workflow_nodes(node.body, items, members)
+        children = node.body
+    elif isinstance(node, WDL.Tree.Scatter):
+        item_type = node.expr.type.item_type
+        items.append(_completion(node.variable, item_type))
+        members[node.variable] = _get_members(item_type)
+        children = node.body
+    elif isinstance(node, WDL.Tree.Conditional):
+        children = node.body
+    elif isinstance(node, WDL.Tree.Call):
+        if node.callee is not None:
+            for binding in node.callee.available_inputs:
+                items.append(
+                    _completion(binding.name, binding.value.type, CompletionItemKind.Field)
+                )
+        children = []
+    else:
+        return scopes
+
+    if items:
+        scopes.append(Scope(node.pos, items, members))
+    for child in children:
+        _get_scopes(child, scopes)
+    return scopes
+
+
+def _add_workflow_nodes(nodes: Iterable[WDL.Tree.WorkflowNode], items, members):
+    for node in nodes:
+        if isinstance(node, WDL.Tree.Decl):
+            _add_decl(node, items, members)
+        elif isinstance(node, WDL.Tree.Call):
+            items.append(CompletionItem(node.name, kind=CompletionItemKind.Method))
+            if node.callee is not None:
+                members[node.name] = [
+                    _completion(binding.name, binding.value, CompletionItemKind.Field)
+                    for binding in node.callee.effective_outputs
+                ]
+        elif isinstance(node, WDL.Tree.WorkflowSection):
+            _add_workflow_nodes(node.body, items, members)
+
+
+def index_recursive(doc: WDL.Tree.Document):
+    types = _get_types(doc.children, dict())
+    defs, refs = _get_links(doc.children, types, dict(), dict())
+    symbols = sorted(_get_symbols(doc.children, []))
+    hovers = _get_hovers(doc.children, dict())
+    scopes = sorted(_get_scopes(doc, []), key=lambda s: s.pos)
+    return types, defs, refs, symbols, hovers, scopes
+
+
+def index_iterative(doc: WDL.Tree.Document):
+    return _index_wdl(doc)
+
+
+def _scope_labels(scopes: List[Scope]):
+    return [
+        (scope.pos, sorted(i.label for i in scope.items), sorted(scope.members))
+        for scope in scopes
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'main.wdl'
+        path.write_text(generate_wdl(args.tasks, args.depth))
+        doc = WDL.load(str(path))
+
+    print('{} tasks, {} nested scatters'.format(args.tasks, args.depth))
+    # both walks must collect the same completion scopes
+    assert _scope_labels(index_recursive(doc)[-1]) == _scope_labels(
+        index_iterative(doc).scopes
+    )
+    results = dict()
+    for name, index in [('recursive', index_recursive), ('iterative', index_iterative)]:
+        try:
+            times = repeat(lambda: index(doc), number=1, repeat=args.repeat)
+        except RecursionError:
+            print('{:>10}: RecursionError (limit {})'.format(name, sys.getrecursionlimit()))
+            continue
+        results[name] = min(times)
+        print('{:>10}: {:8.1f} ms'.format(name, results[name] * 1000))
+    if len(results) == 2:
+        print('{:>10}: {:8.2f}x'.format('speedup', results['recursive'] / results['iterative']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,542 @@
+"""Load test of the WDL language server.
+
+Starts the real server (`python -m wdl_lsp`) over stdio, TCP or in shared
+TCP mode, opens a generated workspace and drives it with scripted editing
+sessions: bursts of didChange, interleaved definition, references, hover and
+completion requests, and storms of watched-file events. Run WDL commands,
+and a batch run over generated inputs files, are executed against a fake
+Cromwell HTTP server on localhost.
+
+Reports throughput, latency percentiles per request, and the thread count
+and peak RSS of the server process.
+
+Usage: python benchmarks/load_test.py [--transport stdio|tcp|shared] [--clients N] ...
+"""
+import argparse
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Any, BinaryIO, Dict, List
+from uuid import uuid4
+
+import psutil
+
+REQUEST_TIMEOUT_SEC = 120
+SAMPLE_SEC = 0.1  # interval of sampling server threads and memory
+
+
+class FakeCromwell(ThreadingHTTPServer):
+    """Minimal Cromwell API: every workflow runs for a number of status polls,
+    and fails if its inputs contain `"fail": true`."""
+
+    def __init__(self, polls: int):
+        super().__init__(('127.0.0.1', 0), FakeCromwellHandler)
+        self.polls = polls
+        self.workflows: Dict[str, List[str]] = dict()
+        self.lock = Lock()
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+    def submit(self, inputs: dict):
+        id = str(uuid4())
+        final = 'Failed' if inputs.get('fail') else 'Succeeded'
+        with self.lock:
+            self.workflows[id] = ['Submitted'] + ['Running'] * self.polls + [final]
+        return {'id': id, 'status': 'Submitted'}
+
+    def poll(self, id: str):
+        with self.lock:
+            statuses = self.workflows[id]
+            return statuses.pop(0) if len(statuses) > 1 else statuses[0]
+
+    def abort(self, id: str):
+        with self.lock:
+            self.workflows[id] = ['Aborted']
+        return {'id': id, 'status': 'Aborted'}
+
+
+class FakeCromwellHandler(BaseHTTPRequestHandler):
+    server: FakeCromwell
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: Any):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self, body: bytes) -> Dict[str, bytes]:
+        content_type = self.headers['Content-Type'].encode()
+        headers = b'Content-Type: ' + content_type + b'\r\n\r\n'
+        message = message_from_bytes(headers + body)
+        return {
+            part.get_param('name', header='content-disposition'): part.get_payload(
+                decode=True
+            )
+            for part in message.get_payload()
+        }
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        path = self.path.rstrip('/').split('/')
+        if path[-1] == 'v1':
+            inputs = self._form(body).get('workflowInputs')
+            self._reply(self.server.submit(json.loads(inputs) if inputs else dict()))
+        elif path[-1] == 'batch':
+            inputs = json.loads(self._form(body)['workflowInputs'])
+            self._reply([self.server.submit(i) for i in inputs])
+        elif path[-1] == 'query':
+            ids = [param['id'] for param in json.loads(body) if 'id' in param]
+            results = [{'id': id, 'status': self.server.poll(id)} for id in ids]
+            self._reply({'results': results, 'totalResultsCount': len(results)})
+        elif path[-1] == 'abort':
+            self._reply(self.server.abort(path[-2]))
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/').split('/')
+        if path[-1] == 'status':
+            self._reply({'id': path[-2], 'status': self.server.poll(path[-2])})
+        elif path[-1] == 'metadata':
+            status = self.server.workflows[path[-2]][-1]
+            failures = [{'message': 'Failed', 'causedBy': []}]
+            self._reply({'status': status, 'calls': {}, 'failures': failures})
+        else:
+            self.send_error(404)
+
+
+class Client:
+    """JSON-RPC client for one LSP connection."""
+
+    def __init__(self, rfile: BinaryIO, wfile: BinaryIO, config: dict):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.config = config
+        self.diagnostics = 0
+        self._write_lock = Lock()
+        self._ids = iter(range(1, sys.maxsize))
+        self._pending: Dict[int, Future] = dict()
+        self._reader = Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def request(self, method: str, params: Any):
+        future: Future = Future()
+        with self._write_lock:
+            id = next(self._ids)
+            self._pending[id] = future
+            self._write({'jsonrpc': '2.0', 'id': id, 'method': method, 'params': params})
+        return future.result(REQUEST_TIMEOUT_SEC)
+
+    def notify(self, method: str, params: Any):
+        with self._write_lock:
+            self._write({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def _write(self, message: dict):
+        body = json.dumps(message).encode()
+        self.wfile.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+        self.wfile.flush()
+
+    def _read(self):
+        while True:
+            length = 0
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+                elif line == b'\r\n':
+                    break
+            message = json.loads(self.rfile.read(length))
+            if 'method' in message and 'id' in message:
+                self._answer(message)
+            elif 'id' in message:
+                future = self._pending.pop(message['id'])
+                if 'error' in message:
+                    future.set_exception(RuntimeError(message['error']['message']))
+                else:
+                    future.set_result(message.get('result'))
+            elif message['method'] == 'textDocument/publishDiagnostics':
+                self.diagnostics += 1
+
+    def _answer(self, message: dict):
+        result = None
+        if message['method'] == 'workspace/configuration':
+            result = [self.config for _ in message['params']['items']]
+        with self._write_lock:
+            self._write({'jsonrpc': '2.0', 'id': message['id'], 'result': result})
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lock = Lock()
+
+    def timed(self, client: Client, method: str, params: Any, name: str = ''):
+        name = name or method
+        start = time.perf_counter()
+        try:
+            return client.request(method, params)
+        except Exception:
+            with self.lock:
+                self.errors[name] += 1
+        finally:
+            with self.lock:
+                self.latencies[name].append(time.perf_counter() - start)
+
+
+class ProcessMonitor(Thread):
+    def __init__(self, pid: int):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.max_threads = 0
+        self.peak_rss = 0
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_SEC):
+            try:
+                self.max_threads = max(self.max_threads, self.process.num_threads())
+                self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            except psutil.Error:
+                return
+
+
+def generate_workspace(root: Path, documents: int, tasks: int):
+    libs = max(1, documents // 4)
+    for lib in range(libs):
+        lines = ['version 1.0', '', 'struct Sample {', '  String name', '  File reads', '}']
+        for t in range(tasks):
+            lines += [
+                '',
+                'task t{} {{'.format(t),
+                '  input {',
+                '    Sample s',
+                '    Int n = {}'.format(t),
+                '  }',
+                '  command <<< echo ~{s.name} ~{n} >>>',
+                '  output {',
+                '    Int out = n + 1',
+                '  }',
+                '}',
+            ]
+        (root / 'lib{}.wdl'.format(lib)).write_text('\n'.join(lines) + '\n')
+
+    uris = []
+    for doc in range(documents):
+        lines = [
+            'version 1.0',
+            '',
+            'import "lib{}.wdl" as lib'.format(doc % libs),
+            '',
+            'workflow w{} {{'.format(doc),
+            '  input {',
+            '    Array[Sample] samples = []',
+            '  }',
+            '  scatter (s in samples) {',
+        ]
+        for t in range(tasks):
+            lines.append('    call lib.t{0} {{ input: s = s, n = {0} }}'.format(t))
+        lines += ['  }', '  output {', '    Array[Int] outs = t0.out', '  }', '}']
+        path = root / 'doc{}.wdl'.format(doc)
+        path.write_text('\n'.join(lines) + '\n')
+        uris.append(path.as_uri())
+    return uris
+
+
+def start_server(args, root: Path):
+    command = [sys.executable, '-m', 'wdl_lsp', '--log', 'ERROR']
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    if args.transport == 'stdio':
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return process, lambda: (process.stdout, process.stdin)
+
+    port = _free_port()
+    command += ['--shared' if args.transport == 'shared' else '--tcp', '--port', str(port)]
+    process = subprocess.Popen(command)
+
+    def connect():
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                sock = socket.create_connection(('127.0.0.1', port))
+                return sock.makefile('rb'), sock.makefile('wb')
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    return process, connect
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def initialize(client: Client, root: Path, uris: List[str]):
+    client.request(
+        'initialize',
+        {'processId': None, 'rootUri': root.as_uri(), 'capabilities': {}},
+    )
+    client.notify('initialized', {})
+    sources = dict()
+    for uri in uris:
+        sources[uri] = Path(uri[len('file://'):]).read_text()
+        client.notify(
+            'textDocument/didOpen',
+            {
+                'textDocument': {
+                    'uri': uri,
+                    'languageId': 'wdl',
+                    'version': 1,
+                    'text': sources[uri],
+                }
+            },
+        )
+    return sources
+
+
+class Session(Thread):
+    """Scripted editing session of one user."""
+
+    QUERIES = (
+        'textDocument/definition',
+        'textDocument/references',
+        'textDocument/hover',
+        'textDocument/completion',
+    )
+
+    def __init__(self, client, stats, args, root, sources, versions, seed):
+        super().__init__(daemon=True)
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.root = root
+        self.sources: Dict[str, str] = sources
+        self.versions: Dict[str, int] = versions
+        self.random = random.Random(seed)
+
+    def run(self):
+        deadline = time.monotonic() + self.args.duration
+        step = 0
+        while time.monotonic() < deadline:
+            uri = self.random.choice(list(self.sources))
+            for _ in range(self.args.burst):
+                self._change(uri)
+                time.sleep(self.args.keystroke_sec)
+            for _ in range(self.args.queries):
+                self._query(uri)
+            step += 1
+            if self.args.storm and step % self.args.storm_every == 0:
+                self._storm(step)
+
+    def _change(self, uri: str):
+        lines = self.sources[uri].split('\n')
+        lines[1] = '# edit {}'.format(self.random.randrange(1000))
+        self.sources[uri] = '\n'.join(lines)
+        self.versions[uri] += 1
+        self.client.notify(
+            'textDocument/didChange',
+            {
+                'textDocument': {'uri': uri, 'version': self.versions[uri]},
+                'contentChanges': [{'text': self.sources[uri]}],
+            },
+        )
+
+    def _query(self, uri: str):
+        lines = self.sources[uri].split('\n')
+        line = self.random.randrange(len(lines))
+        character = self.random.randrange(len(lines[line]) + 1)
+        method = self.random.choice(self.QUERIES)
+        params = {
+            'textDocument': {'uri': uri},
+            'position': {'line': line, 'character': character},
+        }
+        if method == 'textDocument/references':
+            params['context'] = {'includeDeclaration': True}
+        self.stats.timed(self.client, method, params)
+
+    def _storm(self, step: int):
+        paths = [
+            self.root / 'storm_{}_{}_{}.wdl'.format(self.ident, step, i)
+            for i in range(self.args.storm)
+        ]
+        for path in paths:
+            path.write_text('version 1.0\n')
+        self._watched(paths, 1)  # Created
+        for path in paths:
+            path.unlink()
+        self._watched(paths, 3)  # Deleted
+
+    def _watched(self, paths: List[Path], type: int):
+        self.client.notify(
+            'workspace/didChangeWatchedFiles',
+            {'changes': [{'uri': path.as_uri(), 'type': type} for path in paths]},
+        )
+
+
+def run_workflows(client: Client, stats: Stats, uris: List[str], runs: int):
+    threads = [
+        Thread(
+            target=stats.timed,
+            args=(
+                client,
+                'workspace/executeCommand',
+                {'command': 'wdl.run', 'arguments': [{'wdl_uri': uris[i % len(uris)]}]},
+            ),
+            daemon=True,
+        )
+        for i in range(runs)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def write_batch_inputs(root: Path, uri: str, count: int):
+    stem = Path(uri[len('file://'):]).stem
+    uris = []
+    for i in range(count):
+        path = root / '{}.{}.inputs.json'.format(stem, i)
+        # every tenth workflow fails, so that failures of a batch are collected too
+        path.write_text(json.dumps({'fail': i % 10 == 9}))
+        uris.append(path.as_uri())
+    return uris
+
+
+def run_batch(client: Client, stats: Stats, uri: str, inputs_uris: List[str]):
+    params = {'wdl_uri': uri, 'inputs_uris': inputs_uris, 'options_uris': []}
+    thread = Thread(
+        target=stats.timed,
+        args=(
+            client,
+            'workspace/executeCommand',
+            {'command': 'wdl.runBatch', 'arguments': [params]},
+            'executeCommand wdl.runBatch',
+        ),
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def percentile(values: List[float], q: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(stats: Stats, elapsed: float, monitor: ProcessMonitor, clients: List[Client]):
+    total = sum(len(v) for v in stats.latencies.values())
+    print('{:<28} {:>7} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'request', 'count', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'
+    ))
+    for method, latencies in sorted(stats.latencies.items()):
+        print('{:<28} {:>7} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            method,
+            len(latencies),
+            stats.errors[method],
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.9) * 1000,
+            percentile(latencies, 0.99) * 1000,
+            max(latencies) * 1000,
+        ))
+    print()
+    print('throughput:       {:.1f} requests/s over {:.1f} s'.format(total / elapsed, elapsed))
+    print('diagnostics:      {}'.format(sum(c.diagnostics for c in clients)))
+    print('server threads:   {} max'.format(monitor.max_threads))
+    print('server peak RSS:  {:.1f} MiB'.format(monitor.peak_rss / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transport', choices=('stdio', 'tcp', 'shared'), default='stdio')
+    parser.add_argument('--clients', type=int, default=2, help='connections in shared mode')
+    parser.add_argument('--sessions', type=int, default=4, help='editing sessions per client')
+    parser.add_argument('--documents', type=int, default=20)
+    parser.add_argument('--tasks', type=int, default=20, help='tasks per document')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of editing')
+    parser.add_argument('--burst', type=int, default=10, help='didChange per burst')
+    parser.add_argument('--keystroke-sec', type=float, default=0.02)
+    parser.add_argument('--queries', type=int, default=10, help='queries after a burst')
+    parser.add_argument('--storm', type=int, default=20, help='files per watched-file storm')
+    parser.add_argument('--storm-every', type=int, default=5, help='bursts between storms')
+    parser.add_argument('--runs', type=int, default=2, help='Run WDL commands')
+    parser.add_argument(
+        '--batch-inputs', type=int, default=25, help='inputs files of a batch run'
+    )
+    parser.add_argument('--cromwell-polls', type=int, default=3)
+    parser.add_argument('--workers', type=int, help='server workers')
+    args = parser.parse_args()
+
+    cromwell = FakeCromwell(args.cromwell_polls)
+    Thread(target=cromwell.serve_forever, daemon=True).start()
+    config = {'cromwell': {'url': cromwell.url, 'pollSec': 0.1}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        uris = generate_workspace(root, args.documents, args.tasks)
+        batch_inputs = write_batch_inputs(root, uris[0], args.batch_inputs)
+        process, connect = start_server(args, root)
+        monitor = ProcessMonitor(process.pid)
+        monitor.start()
+
+        connections = args.clients if args.transport == 'shared' else 1
+        stats = Stats()
+        clients: List[Client] = []
+        sessions: List[Session] = []
+        for c in range(connections):
+            client = Client(*connect(), config)
+            sources = initialize(client, root, uris)
+            versions = {uri: 1 for uri in uris}
+            clients.append(client)
+            for s in range(args.sessions):
+                # sessions of a client edit their own documents
+                own = {uri: sources[uri] for uri in uris[s :: args.sessions]}
+                seed = c * args.sessions + s
+                sessions.append(Session(client, stats, args, root, own, versions, seed))
+
+        start = time.perf_counter()
+        runs = run_workflows(clients[0], stats, uris, args.runs)
+        if batch_inputs:
+            runs.append(run_batch(clients[-1], stats, uris[0], batch_inputs))
+        for session in sessions:
+            session.start()
+        for thread in sessions + runs:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        scheduler = stats.timed(clients[0], 'wdl/schedulerStats', None)
+        monitor.stopped.set()
+        report(stats, elapsed, monitor, clients)
+        print('cromwell runs:    {}'.format(len(cromwell.workflows)))
+        if scheduler:
+            print('scheduler:        {}'.format(json.dumps(scheduler)))
+
+        process.terminate()
+        process.wait()
+    cromwell.shutdown()
+
+
+if __name__ == '__main__':
+    main()
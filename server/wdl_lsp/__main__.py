@@ -20,6 +20,17 @@ from sys import stderr
 
 from .server import server
 
+def int_at_least(minimum):
+    def parse(value):
+        number = int(value)
+        if number < minimum:
+            raise argparse.ArgumentTypeError(
+                "must be at least {}: {}".format(minimum, value)
+            )
+        return number
+    parse.__name__ = "int"
+    return parse
+
 def add_arguments(parser):
     parser.description = "WDL Language Server"
 
@@ -27,6 +38,10 @@ def add_arguments(parser):
         "-t", "--tcp", action="store_true",
         help="Use TCP server instead of stdio"
     )
+    parser.add_argument(
+        "-s", "--shared", action="store_true",
+        help="Use TCP server shared by multiple clients"
+    )
     parser.add_argument(
         "-a", "--address", default="127.0.0.1",
         help="Bind to this address"
@@ -35,6 +50,18 @@ def add_arguments(parser):
         "-p", "--port", type=int, default=2087,
         help="Bind to this port"
     )
+    parser.add_argument(
+        "-w", "--workers", type=int_at_least(2), default=4,
+        help="Number of workers for queries, parsing and indexing, one kept for queries"
+    )
+    parser.add_argument(
+        "--background-workers", type=int_at_least(1), default=1,
+        help="Maximum number of workers used for workspace indexing"
+    )
+    parser.add_argument(
+        "--cromwell-workers", type=int_at_least(1), default=4,
+        help="Number of workers dedicated to running workflows in Cromwell"
+    )
     parser.add_argument(
         "-l", "--log", default="WARNING",
         choices=("DEBUG", "INFO", "WARNING", "ERROR"),
@@ -51,7 +78,13 @@ def main():
         level = getattr(logging, args.log),
     )
 
-    if args.tcp:
+    server.configure_lanes(
+        args.workers, args.background_workers, args.cromwell_workers
+    )
+
+    if args.shared:
+        server.start_shared_tcp(args.address, args.port)
+    elif args.tcp:
         server.start_tcp(args.address, args.port)
     else:
         server.start_io()
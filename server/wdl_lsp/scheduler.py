@@ -0,0 +1,187 @@
+import logging
+from collections import deque
+from threading import Condition, Thread
+from time import monotonic
+from typing import (Callable, Deque, Dict, Iterable, List, NamedTuple,
+                    Optional, Tuple)
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 1000  # number of most recent queue waits kept per lane
+
+
+class Lane(NamedTuple):
+    priority: int  # lanes with a lower value are served first
+    limit: int  # maximum number of tasks of the lane running at once
+    dedicated: bool = False  # served by its own workers instead of the shared ones
+    reserved: int = 0  # shared workers that lanes of lower priority can not take
+
+
+class Task(NamedTuple):
+    func: Callable
+    args: Tuple
+    kwargs: Dict
+    callback: Optional[Callable]
+    error_callback: Optional[Callable]
+    queued_at: float
+
+
+class LaneState:
+    def __init__(self, lane: Lane):
+        self.lane = lane
+        self.queue: Deque[Task] = deque()
+        self.running = 0
+        self.completed = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def stats(self):
+        waits = sorted(self.waits)
+        return {
+            'queued': len(self.queue),
+            'running': self.running,
+            'completed': self.completed,
+            'waitMs': {
+                'p50': _percentile(waits, 0.5) * 1000,
+                'p99': _percentile(waits, 0.99) * 1000,
+                'max': (waits[-1] if waits else 0) * 1000,
+            },
+        }
+
+
+def _percentile(values: List[float], q: float):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Scheduler:
+    """Runs tasks in priority lanes on a fixed set of worker threads.
+
+    Shared workers always pick the queued task of the highest priority lane,
+    which is below its limit, and leave the workers reserved by higher
+    priority lanes idle. Dedicated lanes get their own workers,
+    so that long running tasks do not hold the shared ones.
+
+    Implements `apply_async` of `multiprocessing.pool.ThreadPool`,
+    which pygls uses to run handlers marked with `thread()`.
+
+    `on_queued` is called with the lane, function, arguments and the number
+    of tasks ahead, for each task that has to wait for its lane's limit.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        lanes: Dict[str, Lane],
+        default_lane: str,
+        on_queued: Optional[Callable[[str, Callable, Tuple, int], None]] = None,
+    ):
+        self.lanes = {name: LaneState(lane) for name, lane in lanes.items()}
+        self.default_lane = default_lane
+        self.on_queued = on_queued
+        self._condition = Condition()
+        self._terminated = False
+        self._workers = workers
+        self._busy = 0  # shared workers running a task
+
+        shared = [name for name, lane in lanes.items() if not lane.dedicated]
+        self._threads = [self._start(shared, True) for _ in range(workers)]
+        for name, lane in lanes.items():
+            if lane.dedicated:
+                self._threads += [
+                    self._start([name], False) for _ in range(lane.limit)
+                ]
+
+    def _start(self, lanes: Iterable[str], shared: bool):
+        names = sorted(lanes, key=lambda name: self.lanes[name].lane.priority)
+        thread = Thread(target=self._work, args=(names, shared), daemon=True)
+        thread.start()
+        return thread
+
+    def submit(
+        self,
+        lane: str,
+        func: Callable,
+        *args,
+        callback: Optional[Callable] = None,
+        error_callback: Optional[Callable] = None,
+        **kwargs
+    ):
+        task = Task(func, args, kwargs, callback, error_callback, monotonic())
+        with self._condition:
+            state = self.lanes[lane]
+            state.queue.append(task)
+            ahead = state.running + len(state.queue) - state.lane.limit
+            self._condition.notify_all()
+        if ahead > 0 and self.on_queued is not None:
+            self.on_queued(lane, func, args, ahead)
+
+    def apply_async(
+        self, func: Callable, args=(), kwds=None, callback=None, error_callback=None
+    ):
+        lane = getattr(getattr(func, 'func', func), 'lane', self.default_lane)
+        self.submit(
+            lane,
+            func,
+            *args,
+            callback=callback,
+            error_callback=error_callback,
+            **(kwds or {})
+        )
+
+    def stats(self):
+        with self._condition:
+            return {name: state.stats() for name, state in self.lanes.items()}
+
+    def terminate(self):
+        with self._condition:
+            self._terminated = True
+            for state in self.lanes.values():
+                state.queue.clear()
+            self._condition.notify_all()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _next(self, names: List[str], shared: bool):
+        reserved = 0
+        for name in names:
+            state = self.lanes[name]
+            if state.queue and state.running < state.lane.limit:
+                if not shared or self._busy + reserved < self._workers:
+                    return state
+            reserved += state.lane.reserved
+        return None
+
+    def _work(self, names: List[str], shared: bool):
+        while True:
+            with self._condition:
+                state = self._next(names, shared)
+                while state is None and not self._terminated:
+                    self._condition.wait()
+                    state = self._next(names, shared)
+                if self._terminated:
+                    return
+                task = state.queue.popleft()
+                state.running += 1
+                if shared:
+                    self._busy += 1
+                state.waits.append(monotonic() - task.queued_at)
+
+            try:
+                result = task.func(*task.args, **task.kwargs)
+                if task.callback is not None:
+                    task.callback(result)
+            except Exception as e:
+                if task.error_callback is not None:
+                    task.error_callback(e)
+                else:
+                    logger.exception(e)
+            finally:
+                with self._condition:
+                    state.running -= 1
+                    if shared:
+                        self._busy -= 1
+                    state.completed += 1
+                    self._condition.notify_all()
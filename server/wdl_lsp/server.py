@@ -2,46 +2,85 @@
 ### https://github.com/openlawlibrary/pygls/blob/master/examples/json-extension/server/server.py
 
 import asyncio
+import json
+import re
 import sys
 from bisect import bisect
-from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from glob import escape
 from importlib.metadata import version
 from os import environ
 from os import name as platform
-from os import pathsep
+from os import pathsep, stat
+from os.path import basename, dirname, isfile
 from pathlib import Path
-from threading import Timer
-from time import sleep
-from typing import (Callable, Dict, Iterable, List, Mapping, Optional, Set,
-                    Tuple, TypedDict, Union)
+from threading import Lock, Timer
+from time import sleep, time
+from typing import (Callable, Dict, Iterable, List, Mapping, NamedTuple,
+                    Optional, Set, Tuple, TypedDict, Union)
 from urllib.parse import urlparse
+from uuid import uuid4
 
+import requests
 import WDL
 from cromwell_tools import api as cromwell_api
 from cromwell_tools.cromwell_auth import CromwellAuth
-from cromwell_tools.utilities import download
-from lsprotocol.types import (TEXT_DOCUMENT_CODE_ACTION,
+from cromwell_tools.utilities import download, prepare_workflow_manifest
+from lsprotocol.types import (EXIT, TEXT_DOCUMENT_CODE_ACTION,
+                              TEXT_DOCUMENT_COMPLETION,
                               TEXT_DOCUMENT_DEFINITION,
                               TEXT_DOCUMENT_DID_CHANGE, TEXT_DOCUMENT_DID_OPEN,
-                              TEXT_DOCUMENT_DID_SAVE, TEXT_DOCUMENT_REFERENCES,
+                              TEXT_DOCUMENT_DID_SAVE, TEXT_DOCUMENT_HOVER,
+                              TEXT_DOCUMENT_REFERENCES,
                               TEXT_DOCUMENT_WILL_SAVE,
                               WORKSPACE_DID_CHANGE_CONFIGURATION,
                               WORKSPACE_DID_CHANGE_WATCHED_FILES,
-                              CodeActionParams, ConfigurationItem,
-                              ConfigurationParams, Diagnostic,
-                              DiagnosticSeverity, DidChangeConfigurationParams,
+                              CodeActionParams, CompletionItem,
+                              CompletionItemKind, CompletionList,
+                              CompletionOptions, CompletionParams,
+                              ConfigurationItem, ConfigurationParams,
+                              Diagnostic, DiagnosticSeverity,
+                              DidChangeConfigurationParams,
                               DidChangeTextDocumentParams,
                               DidChangeWatchedFilesParams,
                               DidOpenTextDocumentParams,
                               DidSaveTextDocumentParams, FileChangeType,
-                              Location, MessageType, Position, Range,
+                              Hover, HoverParams, Location, MarkupContent,
+                              MarkupKind, MessageType, Position, Range,
                               TextDocumentPositionParams,
                               WillSaveTextDocumentParams)
+from pygls.protocol import LanguageServerProtocol, lsp_method
 from pygls.server import LanguageServer
 from requests import HTTPError
 from WDL import Lint, SourceNode, SourcePosition
 
+from .scheduler import Lane, Scheduler
+
 PARSE_DELAY_SEC = 0.5  # delay parsing of WDL until no more keystrokes are sent
+PARSE_CACHE_SIZE = 256  # parses of saved files kept for all clients
+MAX_COLUMN = 2**31 - 1  # end of line, as the largest uinteger allowed by LSP
+MTIME_RESOLUTION_SEC = 2  # coarsest file modification times, as on FAT file systems
+
+
+class Scope(NamedTuple):
+    pos: SourcePosition
+    items: List[CompletionItem]  # identifiers visible within the scope
+    members: Dict[str, List[CompletionItem]]  # members of identifiers, by name
+
+
+class ClientProtocol(LanguageServerProtocol):
+    """Connection of a single client to the shared server,
+    which keeps running after the client disconnects."""
+
+    def connection_lost(self, exc):
+        self._server.disconnect()
+
+    @lsp_method(EXIT)
+    def lsp_exit(self, *args):
+        if self.transport is not None:
+            self.transport.close()
 
 
 class Server(LanguageServer):
@@ -49,15 +88,162 @@ class Server(LanguageServer):
     CONFIG_SECTION = NAME
 
     CMD_RUN_WDL = NAME + '.run'
-
-    def __init__(self):
-        super().__init__(Server.NAME, version('wdl-lsp'))
-        self.wdl_paths: Dict[str, Set[str]] = dict()
+    CMD_RUN_BATCH = NAME + '.runBatch'
+    REQ_SCHEDULER_STATS = NAME + '/schedulerStats'
+    REQ_CALL_GRAPH = NAME + '/callGraph'
+
+    LANE_INTERACTIVE = 'interactive'  # position queries and document events
+    LANE_PARSE = 'parse'  # parsing of edited documents
+    LANE_BACKGROUND = 'background'  # workspace indexing
+    LANE_CROMWELL = 'cromwell'  # workflow submission and monitoring
+
+    def __init__(self, shared: Optional['Server'] = None):
+        self.shared = shared
+        self.clients: Set[Server] = set()
+        self._scheduler: Optional[Scheduler] = None
+        self._scheduler_lock = Lock()
+        self.configure_lanes()
         self.wdl_types: Dict[str, Dict[str, SourcePosition]] = dict()
         self.wdl_defs: Dict[str, Mapping[SourcePosition, SourcePosition]] = dict()
         self.wdl_refs: Dict[str, Dict[SourcePosition, List[SourcePosition]]] = dict()
         self.wdl_symbols: Dict[str, List[SourcePosition]] = dict()
-        self.aborting_workflows: Set[str] = set()
+        self.wdl_hovers: Dict[str, Dict[SourcePosition, str]] = dict()
+        self.wdl_scopes: Dict[str, List[Scope]] = dict()
+        self.wdl_docs: Dict[str, WDL.Tree.Document] = dict()
+
+        if shared is None:
+            super().__init__(Server.NAME, version('wdl-lsp'))
+            self.wdl_paths: Dict[str, Set[str]] = dict()
+            self.wdl_imports: Dict[Tuple[str, Optional[str]], str] = dict()
+            self.wdl_sources: Dict[
+                str, Tuple[Optional[Tuple[int, int]], str]
+            ] = dict()
+            self.wdl_calls: Dict[str, Tuple[int, List[dict]]] = dict()
+            self.wdl_parses: 'OrderedDict[str, ParseResult]' = OrderedDict()
+            self.wdl_parses_lock = Lock()
+            self.wdl_run_files: Dict[Tuple[str, str], Tuple[int, List[str]]] = dict()
+            self.aborting_workflows: Set[str] = set()
+        else:
+            # document tables are per client, as they may be built from unsaved edits,
+            # while parses of saved files, workspace indexes, workers and features
+            # are shared between clients
+            super().__init__(
+                Server.NAME,
+                version('wdl-lsp'),
+                loop=shared.loop,
+                protocol_cls=ClientProtocol,
+            )
+            self.wdl_paths = shared.wdl_paths
+            self.wdl_imports = shared.wdl_imports
+            self.wdl_sources = shared.wdl_sources
+            self.wdl_calls = shared.wdl_calls
+            self.wdl_parses = shared.wdl_parses
+            self.wdl_parses_lock = shared.wdl_parses_lock
+            self.wdl_run_files = shared.wdl_run_files
+            self.aborting_workflows = shared.aborting_workflows
+            self._bind_features(shared)
+
+    def configure_lanes(self, workers=4, background_workers=1, cromwell_workers=4):
+        """Set concurrency limits, before the first task is scheduled."""
+        if workers < 2:
+            raise ValueError('At least two workers are needed, one kept for queries')
+        if min(background_workers, cromwell_workers) < 1:
+            raise ValueError('Each lane needs at least one worker')
+        self.workers = workers
+        self.lanes: Dict[str, Lane] = {
+            # a worker is kept for queries, while documents are parsed and indexed
+            Server.LANE_INTERACTIVE: Lane(0, workers, reserved=1),
+            Server.LANE_PARSE: Lane(1, workers - 1),
+            Server.LANE_BACKGROUND: Lane(2, min(background_workers, workers - 1)),
+            Server.LANE_CROMWELL: Lane(3, cromwell_workers, dedicated=True),
+        }
+
+    @property
+    def scheduler(self) -> Scheduler:
+        if self.shared is not None:
+            return self.shared.scheduler
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = Scheduler(
+                    self.workers,
+                    self.lanes,
+                    Server.LANE_INTERACTIVE,
+                    on_queued=self._on_queued,
+                )
+        return self._scheduler
+
+    def _on_queued(self, lane: str, func: Callable, args: Tuple, ahead: int):
+        # workflow runs hold their worker until done, so a queued run may wait long
+        if lane != Server.LANE_CROMWELL:
+            return
+        ls = self._bound_server(func) or self
+        message = 'Workflow run is queued behind {} other run(s), {} run at once'
+        ls.show_message(message.format(ahead, self.lanes[lane].limit), MessageType.Info)
+
+    @property
+    def thread_pool(self):
+        # pygls runs handlers marked with thread() in this pool
+        return self.scheduler
+
+    def thread(self, lane: str = LANE_INTERACTIVE):
+        decorator = super().thread()
+
+        def lane_decorator(func: Callable):
+            setattr(func, 'lane', lane)
+            return decorator(func)
+
+        return lane_decorator
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.terminate()
+        super().shutdown()
+
+    def _bind_features(self, shared: 'Server'):
+        fm = self.lsp.fm
+        for name, handler in shared.lsp.fm.features.items():
+            fm.features[name] = self._bind_handler(handler)
+        for name, handler in shared.lsp.fm.commands.items():
+            fm.commands[name] = self._bind_handler(handler)
+        fm.feature_options.update(shared.lsp.fm.feature_options)
+
+    @staticmethod
+    def _bound_server(handler: Callable) -> Optional['Server']:
+        if isinstance(handler, partial) and handler.args:
+            if isinstance(handler.args[0], Server):
+                return handler.args[0]
+        return None
+
+    def _bind_handler(self, handler: Callable):
+        if self._bound_server(handler) is None:
+            return handler
+        bound = partial(handler.func, self, *handler.args[1:], **handler.keywords)
+        bound.__dict__.update(handler.__dict__)
+        return bound
+
+    def start_shared_tcp(self, host: str, port: int):
+        """Serve any number of clients, each with its own connection and documents."""
+
+        def connect():
+            client = Server(shared=self)
+            self.clients.add(client)
+            return client.lsp
+
+        self._server = self.loop.run_until_complete(
+            self.loop.create_server(connect, host, port)
+        )
+        try:
+            self.loop.run_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.shutdown()
+
+    def disconnect(self):
+        if self.shared is not None:
+            self.shared.clients.discard(self)
+        # pending parses would keep the client and its documents alive
+        getattr(parse_wdl, 'cancel')(self)
 
     def catch_error(self, log=False):
         def decorator(func: Callable):
@@ -66,10 +252,12 @@ class Server(LanguageServer):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
+                    # report to the client that made the call, if any
+                    ls = args[0] if args and isinstance(args[0], Server) else self
                     if log:
-                        self.show_message_log(str(e), MessageType.Error)
+                        ls.show_message_log(str(e), MessageType.Error)
                     else:
-                        self.show_message(str(e), MessageType.Error)
+                        ls.show_message(str(e), MessageType.Error)
 
             return wrapper
 
@@ -87,30 +275,55 @@ def _get_client_config(ls: Server):
 
 
 # https://gist.github.com/walkermatt/2871026
-def debounce(delay_sec: float, id_arg: Union[int, str]):
+def debounce(delay_sec: float, *id_args: Union[int, str]):
     """Decorator that will postpone a functions
     execution until after wait seconds
     have elapsed since the last time it was invoked."""
 
     def decorator(func: Callable):
+        timers: Dict[tuple, Timer] = dict()
+        lock = Lock()
+
         @wraps(func)
         def debounced(*args, **kwargs):
-            if not hasattr(debounced, 'timers'):
-                debounced.timers = dict()
-            id = args[id_arg] if isinstance(id_arg, int) else kwargs[id_arg]
-            if id in debounced.timers:
-                debounced.timers[id].cancel()
-            timer = Timer(delay_sec, lambda: func(*args, **kwargs))
-            getattr(debounced, 'timers')[id] = timer
+            id = tuple(
+                args[id_arg] if isinstance(id_arg, int) else kwargs[id_arg]
+                for id_arg in id_args
+            )
+
+            def call():
+                with lock:
+                    if timers.get(id) is timer:
+                        del timers[id]
+                func(*args, **kwargs)
+
+            with lock:
+                if id in timers:
+                    timers[id].cancel()
+                timer = Timer(delay_sec, call)
+                timers[id] = timer
             timer.start()
 
+        def cancel(*id_prefix):
+            """Cancel pending calls, whose ids start with the given values."""
+            with lock:
+                for id in [id for id in timers if id[: len(id_prefix)] == id_prefix]:
+                    timers.pop(id).cancel()
+
+        setattr(debounced, 'timers', timers)
+        setattr(debounced, 'cancel', cancel)
         return debounced
 
     return decorator
 
 
-@debounce(PARSE_DELAY_SEC, 1)
+@debounce(PARSE_DELAY_SEC, 0, 1)
 def parse_wdl(ls: Server, uri: str):
+    ls.scheduler.submit(Server.LANE_PARSE, validate_wdl, ls, uri)
+
+
+@server.catch_error(log=True)
+def validate_wdl(ls: Server, uri: str):
     ls.show_message_log('Validating ' + uri, MessageType.Info)
     diagnostics, wdl = _parse_wdl(ls, uri)
     ls.publish_diagnostics(uri, diagnostics)
@@ -122,22 +335,28 @@ def parse_wdl(ls: Server, uri: str):
 
 def _parse_wdl(ls: Server, uri: str):
     try:
-        paths = _get_wdl_paths(ls, uri)
-        doc = asyncio.run(WDL.load_async(uri, path=paths, read_source=_read_source(ls)))
+        parsed = _get_parse(ls, uri)
+        if parsed is None or not _is_current(ls, parsed.doc):
+            parsed = _load_wdl(ls, uri)
 
-        types = _get_types(doc.children, dict())
-        ls.wdl_types[uri] = types
-        ls.wdl_defs[uri], ls.wdl_refs[uri] = _get_links(
-            doc.children, types, dict(), dict()
-        )
-        ls.wdl_symbols[uri] = sorted(_get_symbols(doc.children, []))
+        ls.wdl_types[uri] = parsed.index.types
+        ls.wdl_defs[uri] = parsed.index.defs
+        ls.wdl_refs[uri] = parsed.index.refs
+        ls.wdl_symbols[uri] = parsed.index.symbols
+        ls.wdl_hovers[uri] = parsed.index.hovers
+        ls.wdl_scopes[uri] = parsed.index.scopes
+        ls.wdl_docs[uri] = parsed.doc
 
-        return list(_lint_wdl(ls, doc)), doc
+        return parsed.diagnostics, parsed.doc
 
     except WDL.Error.MultipleValidationErrors as errs:
         return [_diagnostic_err(e) for e in errs.exceptions], None
 
-    except WDLError as e:
+    except (
+        WDL.Error.ImportError,
+        WDL.Error.SyntaxError,
+        WDL.Error.ValidationError,
+    ) as e:
         return [_diagnostic_err(e)], None
 
     except Exception as e:
@@ -145,22 +364,204 @@ def _parse_wdl(ls: Server, uri: str):
         return [], None
 
 
-def _read_source(ls: Server):
+def _load_wdl(ls: Server, uri: str):
+    paths = _get_wdl_paths(ls, uri)
+    edited: Set[str] = set()
+    doc = asyncio.run(
+        WDL.load_async(uri, path=paths, read_source=_read_source(ls, edited))
+    )
+    parsed = ParseResult(doc, _index_wdl(doc), list(_lint_wdl(ls, doc)))
+    # parses of saved files are reused by all clients,
+    # while unsaved edits are only seen by the client that made them
+    if not edited:
+        _put_parse(ls, uri, parsed)
+    return parsed
+
+
+# parses are kept for the most recently used documents only,
+# as the shared server outlives the clients which opened them
+def _get_parse(ls: Server, uri: str) -> Optional['ParseResult']:
+    with ls.wdl_parses_lock:
+        parsed = ls.wdl_parses.get(uri)
+        if parsed is not None:
+            ls.wdl_parses.move_to_end(uri)
+        return parsed
+
+
+def _put_parse(ls: Server, uri: str, parsed: 'ParseResult'):
+    with ls.wdl_parses_lock:
+        ls.wdl_parses[uri] = parsed
+        ls.wdl_parses.move_to_end(uri)
+        while len(ls.wdl_parses) > PARSE_CACHE_SIZE:
+            evicted, _ = ls.wdl_parses.popitem(last=False)
+            ls.wdl_calls.pop(evicted, None)
+
+
+def _drop_parse(ls: Server, uri: str):
+    with ls.wdl_parses_lock:
+        ls.wdl_parses.pop(uri, None)
+        ls.wdl_calls.pop(uri, None)
+
+
+def _read_source(ls: Server, edited: Set[str]):
     async def read_source(uri: str, path, importer):
-        uri = await WDL.resolve_file_import(uri, path, importer)
-        if uri.startswith('/'):
-            uri = 'file://' + uri
-        source = ls.workspace.get_document(uri).source
+        abspath = await _resolve_import(ls, uri, path, importer)
+        uri = 'file://' + abspath if abspath.startswith('/') else abspath
+        source = _get_source(ls, uri)
+        if _is_edited(ls, uri, source):
+            edited.add(uri)
         return WDL.ReadSourceResult(source_text=source, abspath=uri)
 
     return read_source
 
 
-def _get_symbols(nodes: Iterable[SourceNode], symbols: List[SourcePosition]):
-    for node in nodes:
-        symbols.append(node.pos)
-        _get_symbols(node.children, symbols)
-    return symbols
+def _get_source(ls: Server, uri: str):
+    if uri in ls.workspace.text_documents:
+        return ls.workspace.get_text_document(uri).source
+    return _read_file(ls, urlparse(uri).path)
+
+
+def _is_edited(ls: Server, uri: str, source: str):
+    if uri not in ls.workspace.text_documents:
+        return False
+    try:
+        return _read_file(ls, urlparse(uri).path) != source
+    except OSError:
+        return True
+
+
+# reuse the last parse of a WDL, unless it or any of its imports has changed since
+def _get_wdl(ls: Server, uri: str) -> Optional[WDL.Tree.Document]:
+    doc = ls.wdl_docs.get(uri)
+    if doc is not None and _is_current(ls, doc):
+        return doc
+    _, doc = _parse_wdl(ls, uri)
+    return doc
+
+
+def _is_current(ls: Server, doc: WDL.Tree.Document) -> bool:
+    try:
+        if _get_source(ls, doc.pos.abspath) != doc.source_text:
+            return False
+    except OSError:
+        return False
+    return all(_is_current(ls, imp.doc) for imp in doc.imports if imp.doc)
+
+
+# resolved imports are reused while the file exists, and until a WDL file
+# of the same name is created or deleted, see _invalidate_imports;
+# failed lookups are repeated, as clients may not report created files
+async def _resolve_import(
+    ls: Server, uri: str, path: List[str], importer: Optional[WDL.Tree.Document]
+):
+    importer_dir = dirname(importer.pos.abspath) if importer else None
+    key = (uri, importer_dir)
+    abspath = ls.wdl_imports.get(key)
+    if abspath is None or not isfile(abspath):
+        abspath = await WDL.resolve_file_import(uri, path, importer)
+        ls.wdl_imports[key] = abspath
+    return abspath
+
+
+def _invalidate_imports(ls: Server, wdl_uri: str):
+    name = basename(urlparse(wdl_uri).path)
+    for key in list(ls.wdl_imports):
+        if basename(key[0]) == name:
+            ls.wdl_imports.pop(key, None)
+
+
+# files which are not open in the editor are re-read only when modified;
+# recently modified files are always re-read, as a rewrite of the same size
+# may not change the modification time
+def _read_file(ls: Server, abspath: str):
+    st = stat(abspath)
+    modified = (st.st_mtime_ns, st.st_size)
+    cached = ls.wdl_sources.get(abspath)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+    with open(abspath, encoding='utf-8') as f:
+        source = f.read()
+    settled = time() - st.st_mtime > MTIME_RESOLUTION_SEC
+    ls.wdl_sources[abspath] = (modified if settled else None, source)
+    return source
+
+
+class DocumentIndex(NamedTuple):
+    types: Dict[str, SourcePosition]
+    defs: Dict[SourcePosition, SourcePosition]
+    refs: Dict[SourcePosition, List[SourcePosition]]
+    symbols: List[SourcePosition]
+    hovers: Dict[SourcePosition, str]
+    scopes: List[Scope]
+
+
+def _index_wdl(doc: WDL.Tree.Document):
+    index = DocumentIndex(dict(), dict(), dict(), [], dict(), [_get_doc_scope(doc)])
+    # struct declarations are linked once all struct definitions have been seen
+    struct_decls: List[Tuple[SourcePosition, str]] = []
+
+    # pre-order walk with an explicit stack, as nested sections may be arbitrarily deep;
+    # nodes carry the scope their declarations belong to, and whether they are local,
+    # as scopes are not collected within imported documents
+    stack: List[Tuple[SourceNode, Optional[Scope], bool]] = [
+        (node, None, True) for node in doc.children
+    ]
+    stack.reverse()
+    while stack:
+        node, owner, local = stack.pop()
+        index.symbols.append(node.pos)
+        if isinstance(node, WDL.Tree.Document):
+            local = False
+        elif local and not isinstance(node, WDL.Expr.Base):
+            owner = _add_scope(node, owner, index.scopes)
+
+        source: Optional[SourcePosition] = None
+        hover: Optional[str] = None
+        if isinstance(node, WDL.Tree.StructTypeDef):
+            index.types[node.type_id] = node.pos
+        elif isinstance(node, WDL.Tree.Call) and node.callee is not None:
+            source = node.callee.pos
+            hover = _get_signature(node.callee)
+        elif isinstance(node, WDL.Tree.Decl):
+            if isinstance(node.type, WDL.Type.StructInstance):
+                struct_decls.append((node.pos, node.type.type_id))
+            hover = '{} {}'.format(node.type, node.name)
+        elif isinstance(node, WDL.Expr.Ident):
+            ref = node.referee
+            if isinstance(ref, WDL.Tree.Gather):
+                source = ref.final_referee.pos
+            else:
+                source = getattr(ref, 'pos', None)
+            hover = '{} {}'.format(node.type, node.name)
+        elif isinstance(node, WDL.Expr.Get) and node.member is not None:
+            hover = '{} {}'.format(node.type, node.member)
+
+        if source is not None:
+            _add_link(index, node.pos, source)
+        if hover is not None:
+            index.hovers[node.pos] = hover
+
+        children = [(child, owner, local) for child in node.children]
+        children.reverse()
+        stack.extend(children)
+
+    for pos, type_id in struct_decls:
+        if type_id in index.types:
+            _add_link(index, pos, index.types[type_id])
+    index.symbols.sort()
+    index.scopes[:] = sorted((s for s in index.scopes if s.items), key=lambda s: s.pos)
+    return index
+
+
+class ParseResult(NamedTuple):
+    doc: WDL.Tree.Document
+    index: DocumentIndex
+    diagnostics: List[Diagnostic]
+
+
+def _add_link(index: DocumentIndex, pos: SourcePosition, source: SourcePosition):
+    index.defs[pos] = source
+    index.refs.setdefault(source, []).append(pos)
 
 
 # find SourcePosition as the minimum bounding box for cursor Position
@@ -191,41 +592,6 @@ def _find_symbol(ls: Server, uri: str, p: Position):
     return best_sym
 
 
-def _get_types(nodes: Iterable[SourceNode], types: Dict[str, SourcePosition]):
-    for node in nodes:
-        if isinstance(node, WDL.Tree.StructTypeDef):
-            types[node.type_id] = node.pos
-        _get_types(node.children, types)
-    return types
-
-
-def _get_links(
-    nodes: Iterable[SourceNode],
-    types: Dict[str, SourcePosition],
-    defs: Dict[SourcePosition, SourcePosition],
-    refs: Dict[SourcePosition, List[SourcePosition]],
-):
-    for node in nodes:
-        source: Optional[SourcePosition] = None
-        if isinstance(node, WDL.Tree.Call) and node.callee is not None:
-            source = node.callee.pos
-        elif isinstance(node, WDL.Tree.Decl) and isinstance(
-            node.type, WDL.Type.StructInstance
-        ):
-            source = types[node.type.type_id]
-        elif isinstance(node, WDL.Expr.Ident):
-            ref = node.referee
-            if isinstance(ref, WDL.Tree.Gather):
-                source = ref.final_referee.pos
-            else:
-                source = getattr(ref, 'pos', None)
-        if source is not None:
-            defs[node.pos] = source
-            refs.setdefault(source, []).append(node.pos)
-        _get_links(node.children, types, defs, refs)
-    return defs, refs
-
-
 SourceLinks = Union[SourcePosition, List[SourcePosition]]
 
 
@@ -255,6 +621,199 @@ def _find_refs(ls: Server, uri: str, pos: Position):
         return [Location(link.abspath, _get_range(link)) for link in links]
 
 
+def _get_signature(callee: Union[WDL.Tree.Task, WDL.Tree.Workflow]):
+    lines = [
+        '{} {}'.format(
+            'task' if isinstance(callee, WDL.Tree.Task) else 'workflow', callee.name
+        )
+    ]
+    for decl in callee.inputs or []:
+        lines.append('  input {}'.format(decl))
+    for decl in callee.outputs or []:
+        lines.append('  output {} {}'.format(decl.type, decl.name))
+    return '\n'.join(lines)
+
+
+def _find_hover(ls: Server, uri: str, pos: Position):
+    symbol = _find_symbol(ls, uri, pos)
+    if (symbol is None) or (uri not in ls.wdl_hovers):
+        return
+    hovers = ls.wdl_hovers[uri]
+    if symbol in hovers:
+        return Hover(
+            MarkupContent(
+                MarkupKind.Markdown, '```wdl\n{}\n```'.format(hovers[symbol])
+            ),
+            _get_range(symbol),
+        )
+
+
+def _get_doc_scope(doc: WDL.Tree.Document):
+    items: List[CompletionItem] = []
+    for imp in doc.imports:
+        items.append(CompletionItem(imp.namespace, kind=CompletionItemKind.Module))
+    for stb in doc.struct_typedefs:
+        items.append(CompletionItem(str(stb.name), kind=CompletionItemKind.Struct))
+    for task in doc.tasks:
+        items.append(CompletionItem(task.name, kind=CompletionItemKind.Function))
+    return Scope(doc.pos, items, dict())
+
+
+# adds the scope opened by a node, if any,
+# and returns the scope which declarations within the node belong to
+def _add_scope(node: SourceNode, owner: Optional[Scope], scopes: List[Scope]):
+    if isinstance(node, (WDL.Tree.Task, WDL.Tree.Workflow)):
+        owner = Scope(node.pos, [], dict())
+        scopes.append(owner)
+
+    elif isinstance(node, WDL.Tree.Decl) and owner is not None:
+        _add_decl(node, owner.items, owner.members)
+
+    elif isinstance(node, WDL.Tree.Call):
+        if owner is not None:
+            owner.items.append(CompletionItem(node.name, kind=CompletionItemKind.Method))
+            if node.callee is not None:
+                owner.members[node.name] = [
+                    _completion(binding.name, binding.value, CompletionItemKind.Field)
+                    for binding in node.callee.effective_outputs
+                ]
+        if node.callee is not None:
+            items = [
+                _completion(binding.name, binding.value.type, CompletionItemKind.Field)
+                for binding in node.callee.available_inputs
+            ]
+            scopes.append(Scope(node.pos, items, dict()))
+
+    elif isinstance(node, WDL.Tree.Scatter):
+        item_type = node.expr.type.item_type
+        scopes.append(
+            Scope(
+                node.pos,
+                [_completion(node.variable, item_type)],
+                {node.variable: _get_members(item_type)},
+            )
+        )
+    return owner
+
+
+def _add_decl(
+    decl: WDL.Tree.Decl,
+    items: List[CompletionItem],
+    members: Dict[str, List[CompletionItem]],
+):
+    items.append(_completion(decl.name, decl.type))
+    members[decl.name] = _get_members(decl.type)
+
+
+def _get_members(type: WDL.Type.Base):
+    if isinstance(type, WDL.Type.StructInstance) and type.members:
+        return [
+            _completion(name, member_type, CompletionItemKind.Field)
+            for name, member_type in type.members.items()
+        ]
+    elif isinstance(type, WDL.Type.Pair):
+        return [
+            _completion('left', type.left_type, CompletionItemKind.Field),
+            _completion('right', type.right_type, CompletionItemKind.Field),
+        ]
+    return []
+
+
+def _completion(
+    name: str, type: WDL.Type.Base, kind=CompletionItemKind.Variable
+):
+    return CompletionItem(name, kind=kind, detail=str(type))
+
+
+MEMBER_ACCESS = re.compile(r'([A-Za-z_][\w.]*)\.\w*$')
+
+
+def _find_completions(ls: Server, uri: str, pos: Position):
+    if uri not in ls.wdl_scopes:
+        return
+    line = pos.line + 1
+    col = pos.character + 1
+    scopes = [
+        scope
+        for scope in ls.wdl_scopes[uri]
+        if (scope.pos.line, scope.pos.column) <= (line, col)
+        and (scope.pos.end_line, scope.pos.end_column) >= (line, col)
+    ]
+
+    lines = ls.workspace.get_text_document(uri).lines
+    prefix = lines[pos.line][: pos.character] if pos.line < len(lines) else ''
+    access = MEMBER_ACCESS.search(prefix)
+
+    items: Dict[str, CompletionItem] = dict()
+    # scopes are sorted by start, so inner ones override outer ones
+    for scope in scopes:
+        if access is None:
+            items.update((item.label, item) for item in scope.items)
+        elif access.group(1) in scope.members:
+            items = {item.label: item for item in scope.members[access.group(1)]}
+    return CompletionList(is_incomplete=False, items=list(items.values()))
+
+
+def _get_call_graph(ls: Server, doc: WDL.Tree.Document):
+    digests: Dict[str, int] = dict()
+    _get_digest(doc, digests)
+    uri = doc.pos.abspath
+    return {
+        'uri': uri,
+        'documents': sorted(d for d in digests if d != uri),
+        'workflow': doc.workflow.name if doc.workflow else None,
+        'calls': _get_calls(ls, doc.workflow, digests) if doc.workflow else [],
+    }
+
+
+# a document's digest changes with its source or the source of any of its imports
+def _get_digest(doc: WDL.Tree.Document, digests: Dict[str, int]) -> int:
+    uri = doc.pos.abspath
+    if uri not in digests:
+        imports = tuple(_get_digest(imp.doc, digests) for imp in doc.imports if imp.doc)
+        digests[uri] = hash((doc.source_text, imports))
+    return digests[uri]
+
+
+# calls of a workflow are only collected again when its document's digest changes
+def _get_calls(ls: Server, workflow: WDL.Tree.Workflow, digests: Dict[str, int]):
+    uri = workflow.pos.abspath
+    cached = ls.wdl_calls.get(uri)
+    if cached is not None and cached[0] == digests[uri]:
+        return cached[1]
+
+    calls: List[dict] = []
+    stack: List[Tuple[WDL.Tree.WorkflowNode, List[dict]]] = [
+        (node, []) for node in reversed(workflow.body)
+    ]
+    while stack:
+        node, sections = stack.pop()
+        if isinstance(node, WDL.Tree.Call) and node.callee is not None:
+            callee = node.callee
+            call = {
+                'name': node.name,
+                'callee': '.'.join(node.callee_id),
+                'kind': 'task' if isinstance(callee, WDL.Tree.Task) else 'workflow',
+                'range': _get_range(node.pos),
+                'definition': Location(callee.pos.abspath, _get_range(callee.pos)),
+                'sections': sections,
+            }
+            if isinstance(callee, WDL.Tree.Workflow):
+                call['calls'] = _get_calls(ls, callee, digests)
+            calls.append(call)
+        elif isinstance(node, WDL.Tree.WorkflowSection):
+            if isinstance(node, WDL.Tree.Scatter):
+                section = {'kind': 'scatter', 'variable': node.variable}
+            else:
+                section = {'kind': 'if'}
+            section['range'] = _get_range(node.pos)
+            nested = sections + [section]
+            stack.extend((child, nested) for child in reversed(node.body))
+
+    ls.wdl_calls[uri] = (digests[uri], calls)
+    return calls
+
+
 def _lint_wdl(ls: Server, doc: WDL.Tree.Document):
     _check_linter_path()
     warnings = Lint.collect(Lint.lint(doc, descend_imports=False))
@@ -327,8 +886,8 @@ def _diagnostic(
 def _get_range(p: Optional[SourcePosition] = None):
     if p is None:
         return Range(
-            Position(0, sys.maxsize),
-            Position(0, sys.maxsize),
+            Position(0, MAX_COLUMN),
+            Position(0, MAX_COLUMN),
         )
     else:
         return Range(
@@ -376,16 +935,22 @@ def did_change_configuration(ls: Server, params: DidChangeConfigurationParams):
     pass
 
 
-@server.thread()
+@server.thread(Server.LANE_BACKGROUND)
 @server.feature(WORKSPACE_DID_CHANGE_WATCHED_FILES)
 @server.catch_error()
 def did_change_watched_files(ls: Server, params: DidChangeWatchedFilesParams):
     for change in params.changes:
+        if not change.uri.endswith('.wdl'):
+            continue
+        ls.wdl_sources.pop(urlparse(change.uri).path, None)
+        if change.type == FileChangeType.Deleted:
+            _drop_parse(ls, change.uri)
         if change.type in [
             FileChangeType.Created,
             FileChangeType.Deleted,
-        ] and change.uri.endswith('.wdl'):
+        ]:
             _get_wdl_paths(ls, change.uri, reuse_paths=False)
+            _invalidate_imports(ls, change.uri)
 
 
 @server.thread()
@@ -402,33 +967,130 @@ def find_TEXT_DOCUMENT_REFERENCES(ls: Server, params: TextDocumentPositionParams
     return _find_refs(ls, params.text_document.uri, params.position)
 
 
+@server.thread()
+@server.feature(TEXT_DOCUMENT_HOVER)
+@server.catch_error()
+def hover(ls: Server, params: HoverParams):
+    return _find_hover(ls, params.text_document.uri, params.position)
+
+
+@server.thread()
+@server.feature(TEXT_DOCUMENT_COMPLETION, CompletionOptions(trigger_characters=['.']))
+@server.catch_error()
+def completion(ls: Server, params: CompletionParams):
+    return _find_completions(ls, params.text_document.uri, params.position)
+
+
+class CallGraphParams(TypedDict):
+    uri: str
+
+
+@server.thread(Server.LANE_PARSE)
+@server.feature(Server.REQ_CALL_GRAPH)
+@server.catch_error()
+def call_graph(ls: Server, params: CallGraphParams):
+    uri = params['uri'] if isinstance(params, dict) else params.uri
+    if uri not in ls.workspace.text_documents:
+        doc = _get_wdl(ls, uri)
+    else:
+        doc = ls.wdl_docs.get(uri)
+        # edits of the document itself are parsed by parse_wdl, so its last
+        # successful parse is answered meanwhile; changed imports are parsed here
+        if (
+            doc is not None
+            and _get_source(ls, uri) == doc.source_text
+            and not _is_current(ls, doc)
+        ):
+            diagnostics, doc = _parse_wdl(ls, uri)
+            ls.publish_diagnostics(uri, diagnostics)
+    if doc is not None:
+        return _get_call_graph(ls, doc)
+
+
+@server.feature(Server.REQ_SCHEDULER_STATS)
+def scheduler_stats(ls: Server, params):
+    return ls.scheduler.stats()
+
+
 class RunWDLParams(TypedDict):
     wdl_uri: str
 
 
+class RunBatchParams(TypedDict):
+    wdl_uri: str
+    inputs_uris: List[str]
+    options_uris: List[str]
+
+
+@server.thread()
 @server.feature(TEXT_DOCUMENT_CODE_ACTION)
 @server.catch_error()
 def code_action(ls: Server, params: CodeActionParams):
-    return [
+    wdl_uri = params.text_document.uri
+    actions = [
         {
             'title': 'Run WDL',
             'kind': Server.CMD_RUN_WDL,
             'command': {
                 'command': Server.CMD_RUN_WDL,
-                'arguments': [RunWDLParams(wdl_uri=params.text_document.uri)],
+                'arguments': [RunWDLParams(wdl_uri=wdl_uri)],
             },
         }
     ]
+    inputs_uris = _find_run_files(ls, wdl_uri, 'inputs')
+    if inputs_uris:
+        actions.append(
+            {
+                'title': 'Run WDL for {} inputs'.format(len(inputs_uris)),
+                'kind': Server.CMD_RUN_BATCH,
+                'command': {
+                    'command': Server.CMD_RUN_BATCH,
+                    'arguments': [
+                        RunBatchParams(
+                            wdl_uri=wdl_uri,
+                            inputs_uris=inputs_uris,
+                            options_uris=_find_run_files(ls, wdl_uri, 'options'),
+                        )
+                    ],
+                },
+            }
+        )
+    return actions
 
 
-@server.thread()
+# files next to the WDL, named as <wdl name>[.<any>].<kind>.json,
+# which are looked up again only when the directory is modified
+def _find_run_files(ls: Server, wdl_uri: str, kind: str):
+    wdl_path = Path(urlparse(wdl_uri).path)
+    try:
+        st = stat(wdl_path.parent)
+    except OSError:
+        return []
+    key = (str(wdl_path), kind)
+    cached = ls.wdl_run_files.get(key)
+    if cached is not None and cached[0] == st.st_mtime_ns:
+        return cached[1]
+
+    stem = escape(wdl_path.stem)
+    patterns = ['{}.{}.json'.format(stem, kind), '{}.*.{}.json'.format(stem, kind)]
+    uris = sorted(
+        'file://' + str(p)
+        for pattern in patterns
+        for p in wdl_path.parent.glob(pattern)
+    )
+    if time() - st.st_mtime > MTIME_RESOLUTION_SEC:
+        ls.wdl_run_files[key] = (st.st_mtime_ns, uris)
+    return uris
+
+
+@server.thread(Server.LANE_CROMWELL)
 @server.command(Server.CMD_RUN_WDL)
 @server.catch_error()
 def run_wdl(ls: Server, params: Tuple[RunWDLParams]):
     wdl_uri = params[0]['wdl_uri']
     wdl_path = urlparse(wdl_uri).path
 
-    _, wdl = _parse_wdl(ls, wdl_uri)
+    wdl = _get_wdl(ls, wdl_uri)
     if not wdl:
         return ls.show_message(
             'Unable to submit: WDL contains error(s)', MessageType.Error
@@ -486,7 +1148,7 @@ def run_wdl(ls: Server, params: Tuple[RunWDLParams]):
             message = '{}: {}'.format(title, status)
             ls.show_message(message, message_type)
 
-            diagnostics = _parse_failures(wdl, id, auth)
+            diagnostics = _parse_failures(ls, wdl, id, auth)
             return ls.publish_diagnostics(wdl_uri, diagnostics)
 
         sleep(cromwell['pollSec'])
@@ -519,7 +1181,210 @@ def abort_workflow(ls: Server, params):
     ls.aborting_workflows.add(params.id)
 
 
-def _parse_failures(wdl: WDL.Tree.Document, id: str, auth: CromwellAuth):
+BATCH_SIZE = 20  # workflows submitted in one request to Cromwell
+BATCH_CONCURRENCY = 2  # requests to Cromwell in flight at once
+BATCH_ENDPOINT = '/api/workflows/v1/batch'
+WORKFLOW_DONE = ('Succeeded', 'Failed', 'Aborted')
+
+
+@server.thread(Server.LANE_CROMWELL)
+@server.command(Server.CMD_RUN_BATCH)
+@server.catch_error()
+def run_batch(ls: Server, params: Tuple[RunBatchParams]):
+    wdl_uri = params[0]['wdl_uri']
+    wdl_path = urlparse(wdl_uri).path
+
+    wdl = _get_wdl(ls, wdl_uri)
+    if not wdl:
+        return ls.show_message(
+            'Unable to submit: WDL contains error(s)', MessageType.Error
+        )
+
+    inputs_uris: List[Optional[str]] = list(params[0].get('inputs_uris') or [None])
+    options_uris: List[Optional[str]] = list(params[0].get('options_uris') or [None])
+    inputs = [_read_json(ls, uri) if uri else dict() for uri in inputs_uris]
+    runs = [
+        (options_uri, [inputs_uri for inputs_uri, _ in chunk], [i for _, i in chunk])
+        for options_uri in options_uris
+        for chunk in _chunks(list(zip(inputs_uris, inputs)), BATCH_SIZE)
+    ]
+
+    cromwell = _get_client_config(ls)['cromwell']
+    auth = CromwellAuth.from_no_authentication(cromwell['url'])  # type: ignore
+
+    def submit(run: Tuple[Optional[str], List[Optional[str]], List[dict]]):
+        options_uri, names, batch_inputs = run
+        workflows = _submit_batch(auth, wdl_path, batch_inputs, options_uri)
+        return [
+            (workflow['id'], workflow['status'], name, options_uri)
+            for workflow, name in zip(workflows, names)
+        ]
+
+    with ThreadPoolExecutor(BATCH_CONCURRENCY) as executor:
+        futures = [executor.submit(submit, run) for run in runs]
+
+    # workflows of accepted chunks are monitored, even if other chunks failed
+    submitted: List[Tuple[str, str, Optional[str], Optional[str]]] = []
+    failures: List[str] = []
+    for (options_uri, names, _), future in zip(runs, futures):
+        try:
+            submitted += future.result()
+        except Exception as e:
+            chunk = ', '.join(_run_label(name, options_uri) for name in names)
+            failures.append('{}: {}'.format(chunk, e))
+    if failures:
+        ls.show_message(
+            'Unable to submit {} of {} batches for {}:\n{}'.format(
+                len(failures), len(runs), wdl_path, '\n'.join(failures)
+            ),
+            MessageType.Error,
+        )
+    if not submitted:
+        return
+
+    statuses = {id: status for id, status, _, _ in submitted}
+    labels = {
+        id: _run_label(inputs_uri, options_uri)
+        for id, _, inputs_uri, options_uri in submitted
+    }
+    _monitor_batch(ls, wdl, wdl_uri, auth, cromwell['pollSec'], statuses, labels)
+
+
+# inputs files are read as edited, but not kept along with WDL sources
+def _read_json(ls: Server, uri: str):
+    if uri in ls.workspace.text_documents:
+        return json.loads(ls.workspace.get_text_document(uri).source)
+    with open(urlparse(uri).path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _chunks(items: list, size: int):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _run_label(inputs_uri: Optional[str], options_uri: Optional[str]):
+    names = [Path(urlparse(uri).path).name for uri in (inputs_uri, options_uri) if uri]
+    return ', '.join(names) or 'no inputs'
+
+
+def _submit_batch(
+    auth: CromwellAuth, wdl_path: str, inputs: List[dict], options_uri: Optional[str]
+) -> List[dict]:
+    manifest = prepare_workflow_manifest(
+        wdl_file=wdl_path,
+        options_file=urlparse(options_uri).path if options_uri else None,
+    )
+    manifest['workflowInputs'] = json.dumps(inputs)
+    response = requests.post(
+        auth.url + BATCH_ENDPOINT,
+        files=manifest,
+        auth=auth.auth,
+        headers=auth.header,
+    )
+    if not response.ok:
+        raise HTTPError(
+            'Error Code {0}: {1}'.format(response.status_code, response.text),
+            response=response,
+        )
+    return response.json()
+
+
+def _monitor_batch(
+    ls: Server,
+    wdl: WDL.Tree.Document,
+    wdl_uri: str,
+    auth: CromwellAuth,
+    poll_sec: int,
+    statuses: Dict[str, str],
+    labels: Dict[str, str],
+):
+    wdl_path = urlparse(wdl_uri).path
+    id = uuid4().hex
+    title = '{} workflows for {}'.format(len(statuses), wdl_path)
+    _progress(
+        ls,
+        'start',
+        {
+            'id': id,
+            'title': title,
+            'cancellable': True,
+            'message': _count_statuses(statuses),
+        },
+    )
+
+    while True:
+        running = [w for w, status in statuses.items() if status not in WORKFLOW_DONE]
+        if not running:
+            break
+
+        sleep(poll_sec)
+
+        if id in ls.aborting_workflows:
+            for workflow_id in running:
+                _abort(ls, workflow_id, auth)
+            ls.aborting_workflows.remove(id)
+
+        try:
+            results = cromwell_api.query(  # type: ignore
+                {'id': running},
+                auth,
+                raise_for_status=True,
+            ).json()['results']
+        except HTTPError as e:
+            ls.show_message_log(str(e), MessageType.Error)
+            continue
+        for result in results:
+            statuses[result['id']] = result['status']
+
+        _progress(
+            ls,
+            'report',
+            {
+                'id': id,
+                'message': _count_statuses(statuses),
+            },
+        )
+
+    _progress(
+        ls,
+        'done',
+        {
+            'id': id,
+        },
+    )
+    failed = [w for w, status in statuses.items() if status == 'Failed']
+    ls.show_message(
+        '{}: {}'.format(title, _count_statuses(statuses)),
+        MessageType.Error if failed else MessageType.Info,
+    )
+
+    diagnostics: List[Diagnostic] = []
+    for workflow_id in failed:
+        for diagnostic in _parse_failures(ls, wdl, workflow_id, auth) or []:
+            msg = 'Workflow {} ({}): {}'.format(
+                workflow_id, labels[workflow_id], diagnostic.message
+            )
+            diagnostics.append(
+                Diagnostic(diagnostic.range, msg, severity=diagnostic.severity)
+            )
+    ls.publish_diagnostics(wdl_uri, diagnostics)
+
+
+def _count_statuses(statuses: Dict[str, str]):
+    counts: Dict[str, int] = dict()
+    for status in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    return ', '.join('{} {}'.format(n, status) for status, n in sorted(counts.items()))
+
+
+@server.catch_error(log=True)
+def _abort(ls: Server, id: str, auth: CromwellAuth):
+    cromwell_api.abort(id, auth, raise_for_status=True)  # type: ignore
+
+
+def _parse_failures(
+    ls: Server, wdl: WDL.Tree.Document, id: str, auth: CromwellAuth
+):
     workflow = cromwell_api.metadata(  # type: ignore
         id,
         auth,
@@ -540,7 +1405,7 @@ def _parse_failures(wdl: WDL.Tree.Document, id: str, auth: CromwellAuth):
                     pos = _find_call(wdl.workflow.children, wdl.workflow.name, call)
                     failures = _collect_failures(attempt['failures'], [])
 
-                    stderr = _download(attempt['stderr'])
+                    stderr = _download(ls, attempt['stderr'])
                     if stderr is not None:
                         failures.append(stderr)
 
@@ -577,7 +1442,7 @@ def _find_call(elements: Iterable[SourceNode], wf_name: str, call_name: str):
 
 
 @server.catch_error(log=True)
-def _download(url: str):
+def _download(ls: Server, url: str):
     text = download(url)
     if isinstance(text, str):
         return text
@@ -0,0 +1,92 @@
+from textwrap import dedent
+
+import pytest
+from lsprotocol.types import TextDocumentItem
+from pygls.workspace import Workspace
+
+from ...server import Server
+
+LIB_WDL = dedent('''\
+    version 1.0
+
+    struct Sample {
+      String name
+      File reads
+    }
+
+    task align {
+      input {
+        Sample s
+        Int threads = 4
+      }
+      command <<< echo ~{s.name} >>>
+      output {
+        File bam = "out.bam"
+      }
+    }
+''')
+
+MAIN_WDL = dedent('''\
+    version 1.0
+
+    import "lib.wdl" as lib
+
+    workflow main {
+      input {
+        Array[Sample] samples
+      }
+      scatter (s in samples) {
+        call lib.align { input: s = s }
+      }
+      output {
+        Array[File] bams = align.bam
+      }
+    }
+''')
+
+
+class FakeServer(Server):
+    """Server with a workspace that does not need an LSP connection."""
+
+    def __init__(self, workspace: Workspace, shared: 'Server' = None):
+        super().__init__(shared)
+        self._workspace = workspace
+        self.show_message = lambda *args: None
+        self.show_message_log = lambda *args: None
+        self.publish_diagnostics = lambda *args: None
+
+    @property
+    def workspace(self):
+        return self._workspace
+
+
+@pytest.fixture
+def disk_server(tmp_path):
+    """Server for a workspace with lib.wdl and main.wdl on disk."""
+    for name, source in [('lib.wdl', LIB_WDL), ('main.wdl', MAIN_WDL)]:
+        (tmp_path / name).write_text(source)
+    return FakeServer(Workspace('file://' + str(tmp_path)))
+
+
+@pytest.fixture
+def server(disk_server):
+    """Server for a workspace with lib.wdl and main.wdl, also open in the editor."""
+    for name, source in [('lib.wdl', LIB_WDL), ('main.wdl', MAIN_WDL)]:
+        disk_server.workspace.put_text_document(
+            TextDocumentItem(doc_uri(disk_server, name), 'wdl', 1, source)
+        )
+    return disk_server
+
+
+def doc_uri(server: Server, name: str):
+    return server.workspace.root_uri + '/' + name
+
+
+def set_text(server: Server, uri: str, source: str):
+    server.workspace.put_text_document(TextDocumentItem(uri, 'wdl', 2, source))
+
+
+def set_line(server: Server, uri: str, line: int, text: str):
+    lines = server.workspace.get_text_document(uri).lines
+    lines[line] = text
+    set_text(server, uri, ''.join(lines))
@@ -0,0 +1,98 @@
+from os import utime
+
+from requests import HTTPError
+
+from ...server import (BATCH_SIZE, RunBatchParams, _count_statuses,
+                       _find_run_files, _get_wdl, run_batch)
+from .conftest import LIB_WDL, doc_uri
+
+
+def test_find_run_files(disk_server, tmp_path):
+    for name in ['main.a.inputs.json', 'main.inputs.json', 'main.options.json',
+                 'main_other.inputs.json', 'other.inputs.json']:
+        (tmp_path / name).write_text('{}')
+    wdl_uri = doc_uri(disk_server, 'main.wdl')
+
+    assert _find_run_files(disk_server, wdl_uri, 'inputs') == [
+        'file://{}/main.a.inputs.json'.format(tmp_path),
+        'file://{}/main.inputs.json'.format(tmp_path),
+    ]
+    assert _find_run_files(disk_server, wdl_uri, 'options') == [
+        'file://{}/main.options.json'.format(tmp_path),
+    ]
+
+
+def test_find_run_files_escapes_name(disk_server, tmp_path):
+    for name in ['main[1].wdl', 'main[1].inputs.json', 'main1.inputs.json']:
+        (tmp_path / name).write_text('{}')
+    wdl_uri = doc_uri(disk_server, 'main[1].wdl')
+
+    assert _find_run_files(disk_server, wdl_uri, 'inputs') == [
+        'file://{}/main[1].inputs.json'.format(tmp_path),
+    ]
+
+
+def test_find_run_files_cached_until_modified(disk_server, tmp_path):
+    (tmp_path / 'main.inputs.json').write_text('{}')
+    utime(tmp_path, (0, 0))
+    wdl_uri = doc_uri(disk_server, 'main.wdl')
+    uris = _find_run_files(disk_server, wdl_uri, 'inputs')
+    assert _find_run_files(disk_server, wdl_uri, 'inputs') is uris
+
+    (tmp_path / 'main.b.inputs.json').write_text('{}')
+    assert len(_find_run_files(disk_server, wdl_uri, 'inputs')) == 2
+
+
+def test_count_statuses():
+    statuses = {'a': 'Running', 'b': 'Failed', 'c': 'Running'}
+    assert _count_statuses(statuses) == '1 Failed, 2 Running'
+
+
+def test_get_wdl_reuses_parse(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+
+    wdl = _get_wdl(disk_server, uri)
+    assert wdl is not None
+    assert _get_wdl(disk_server, uri) is wdl
+
+    (tmp_path / 'lib.wdl').write_text(LIB_WDL.replace('Int threads = 4', 'Int threads = 16'))
+    assert _get_wdl(disk_server, uri) is not wdl
+
+
+def test_failed_chunks_do_not_stop_monitoring(disk_server, tmp_path, monkeypatch):
+    inputs_uris = []
+    for i in range(BATCH_SIZE + 1):
+        (tmp_path / 'main.{}.inputs.json'.format(i)).write_text('{}')
+        inputs_uris.append(doc_uri(disk_server, 'main.{}.inputs.json'.format(i)))
+    messages = []
+    disk_server.show_message = lambda message, *args: messages.append(message)
+    monitored = []
+
+    def submit_batch(auth, wdl_path, inputs, options_uri):
+        if len(inputs) == 1:
+            raise HTTPError('Error Code 500: unavailable')
+        return [{'id': str(i), 'status': 'Submitted'} for i in range(len(inputs))]
+
+    monkeypatch.setattr('wdl_lsp.server._submit_batch', submit_batch)
+    monkeypatch.setattr(
+        'wdl_lsp.server._get_client_config',
+        lambda ls: {'cromwell': {'url': 'http://localhost', 'pollSec': 0}},
+    )
+    monkeypatch.setattr(
+        'wdl_lsp.server._monitor_batch', lambda *args: monitored.append(args[-2])
+    )
+    run_batch(
+        disk_server,
+        [RunBatchParams(
+            wdl_uri=doc_uri(disk_server, 'main.wdl'),
+            inputs_uris=inputs_uris,
+            options_uris=[],
+        )],
+    )
+
+    assert len(monitored[0]) == BATCH_SIZE
+    assert not any(path.endswith('.json') for path in disk_server.wdl_sources)
+    assert messages == [
+        'Unable to submit 1 of 2 batches for {}/main.wdl:\n'
+        'main.20.inputs.json: Error Code 500: unavailable'.format(tmp_path)
+    ]
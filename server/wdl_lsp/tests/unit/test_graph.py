@@ -0,0 +1,89 @@
+from ...server import _get_call_graph, _get_wdl, _parse_wdl, call_graph
+from .conftest import doc_uri, set_line
+
+NESTED_WDL = '''\
+version 1.0
+
+import "main.wdl" as main
+
+workflow nested {
+  input {
+    Boolean run
+  }
+  if (run) {
+    call main.main
+  }
+}
+'''
+
+
+def test_call_graph(server):
+    uri = doc_uri(server, 'main.wdl')
+    graph = _get_call_graph(server, _get_wdl(server, uri))
+
+    assert graph['workflow'] == 'main'
+    assert graph['documents'] == [doc_uri(server, 'lib.wdl')]
+    [call] = graph['calls']
+    assert (call['name'], call['callee'], call['kind']) == ('align', 'lib.align', 'task')
+    assert call['definition'].uri == doc_uri(server, 'lib.wdl')
+    assert [(s['kind'], s['variable']) for s in call['sections']] == [('scatter', 's')]
+
+
+def test_call_graph_nested(server, tmp_path):
+    # documents which are not open are parsed on request
+    (tmp_path / 'nested.wdl').write_text(NESTED_WDL)
+    graph = call_graph(server, {'uri': doc_uri(server, 'nested.wdl')})
+
+    documents = [doc_uri(server, 'lib.wdl'), doc_uri(server, 'main.wdl')]
+    assert graph['documents'] == documents
+    [call] = graph['calls']
+    assert call['kind'] == 'workflow'
+    assert [s['kind'] for s in call['sections']] == ['if']
+    assert [c['callee'] for c in call['calls']] == ['lib.align']
+
+
+def test_call_graph_after_file_change(server, tmp_path):
+    uri = doc_uri(server, 'nested.wdl')
+    (tmp_path / 'nested.wdl').write_text(NESTED_WDL)
+    [call] = call_graph(server, {'uri': uri})['calls']
+    assert call['name'] == 'main'
+
+    renamed = NESTED_WDL.replace('main.main', 'main.main as inner')
+    (tmp_path / 'nested.wdl').write_text(renamed)
+    [call] = call_graph(server, {'uri': uri})['calls']
+    assert call['name'] == 'inner'
+
+
+def test_call_graph_after_import_change(server):
+    uri = doc_uri(server, 'main.wdl')
+    _parse_wdl(server, uri)
+    [call] = call_graph(server, {'uri': uri})['calls']
+    assert call['definition'].range.start.line == 7
+
+    set_line(server, doc_uri(server, 'lib.wdl'), 1, '\n\n')
+    [call] = call_graph(server, {'uri': uri})['calls']
+    assert call['definition'].range.start.line == 8
+
+
+def test_call_graph_from_last_parse(server, monkeypatch):
+    uri = doc_uri(server, 'main.wdl')
+    assert call_graph(server, {'uri': uri}) is None
+
+    _parse_wdl(server, uri)
+    set_line(server, uri, 9, '    call lib.align { input: s = }\n')
+
+    def load_wdl(*args):
+        raise AssertionError('open documents are parsed by parse_wdl')
+
+    monkeypatch.setattr('wdl_lsp.server._load_wdl', load_wdl)
+    graph = call_graph(server, {'uri': uri})
+    assert [c['callee'] for c in graph['calls']] == ['lib.align']
+
+
+def test_call_graph_cache(server):
+    uri = doc_uri(server, 'main.wdl')
+    calls = _get_call_graph(server, _get_wdl(server, uri))['calls']
+    assert _get_call_graph(server, _get_wdl(server, uri))['calls'] is calls
+
+    set_line(server, doc_uri(server, 'lib.wdl'), 10, '    Int threads = 16\n')
+    assert _get_call_graph(server, _get_wdl(server, uri))['calls'] is not calls
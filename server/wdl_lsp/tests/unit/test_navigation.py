@@ -0,0 +1,70 @@
+from lsprotocol.types import Position
+
+from ...server import (_find_completions, _find_def, _find_hover, _find_refs,
+                       _parse_wdl)
+from .conftest import doc_uri, set_line
+
+
+def test_struct_links(server):
+    uri = doc_uri(server, 'lib.wdl')
+    _parse_wdl(server, uri)
+
+    location = _find_def(server, uri, Position(9, 6))
+    assert location.range.start.line == 2
+
+    locations = _find_refs(server, uri, Position(2, 0))
+    assert [loc.range.start.line for loc in locations] == [9]
+
+
+def test_hover_decl(server):
+    uri = doc_uri(server, 'main.wdl')
+    _, wdl = _parse_wdl(server, uri)
+    assert wdl
+
+    hover = _find_hover(server, uri, Position(6, 20))
+    assert 'Array[Sample] samples' in hover.contents.value
+
+
+def test_hover_call_signature(server):
+    uri = doc_uri(server, 'main.wdl')
+    _parse_wdl(server, uri)
+
+    hover = _find_hover(server, uri, Position(9, 14))
+    assert 'task align' in hover.contents.value
+    assert 'input Int threads = 4' in hover.contents.value
+    assert 'output File bam' in hover.contents.value
+
+
+def test_hover_before_parse(server):
+    uri = doc_uri(server, 'main.wdl')
+    assert _find_hover(server, uri, Position(6, 20)) is None
+    assert _find_completions(server, uri, Position(6, 20)) is None
+
+
+def test_complete_identifiers(server):
+    uri = doc_uri(server, 'main.wdl')
+    _parse_wdl(server, uri)
+
+    labels = [i.label for i in _find_completions(server, uri, Position(12, 24)).items]
+    assert {'lib', 'Sample', 'samples', 'align', 'bams'} <= set(labels)
+
+
+def test_complete_call_inputs(server):
+    uri = doc_uri(server, 'main.wdl')
+    _parse_wdl(server, uri)
+
+    labels = [i.label for i in _find_completions(server, uri, Position(9, 28)).items]
+    assert {'s', 'threads'} <= set(labels)
+
+
+def test_complete_members(server):
+    uri = doc_uri(server, 'main.wdl')
+    _parse_wdl(server, uri)
+
+    set_line(server, uri, 9, '    call lib.align { input: s = s. }\n')
+    items = _find_completions(server, uri, Position(9, 34)).items
+    assert [(i.label, i.detail) for i in items] == [('name', 'String'), ('reads', 'File')]
+
+    set_line(server, uri, 12, '    Array[File] bams = align.\n')
+    items = _find_completions(server, uri, Position(12, 29)).items
+    assert [(i.label, i.detail) for i in items] == [('bam', 'File')]
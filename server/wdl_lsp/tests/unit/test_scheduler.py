@@ -0,0 +1,121 @@
+from threading import Event
+from time import monotonic, sleep
+
+from ...scheduler import Lane, Scheduler
+from ...server import Server
+
+
+def _scheduler(workers=1):
+    return Scheduler(
+        workers,
+        {
+            'high': Lane(0, workers),
+            'low': Lane(1, 1),
+            'own': Lane(2, 1, dedicated=True),
+        },
+        'high',
+    )
+
+
+def test_priority_order():
+    scheduler = _scheduler()
+    blocker = Event()
+    done = Event()
+    order = []
+
+    scheduler.submit('high', blocker.wait)
+    scheduler.submit('low', order.append, 'low')
+    scheduler.submit('high', order.append, 'high')
+    scheduler.submit('low', done.set)
+    blocker.set()
+    assert done.wait(5)
+    assert order == ['high', 'low']
+    scheduler.terminate()
+
+
+def test_dedicated_lane_not_blocked():
+    scheduler = _scheduler()
+    blocker = Event()
+    done = Event()
+
+    scheduler.submit('high', blocker.wait)
+    scheduler.submit('own', done.set)
+    assert done.wait(5)
+    blocker.set()
+    scheduler.terminate()
+
+
+def test_apply_async_lane_and_callbacks():
+    scheduler = _scheduler()
+    results = []
+    errors = []
+    done = Event()
+
+    def handler(x):
+        return x * 2
+
+    handler.lane = 'low'
+
+    def fail():
+        raise ValueError('failed')
+
+    scheduler.apply_async(handler, (2,), callback=results.append)
+    scheduler.apply_async(fail, error_callback=errors.append)
+    scheduler.submit('low', done.set)
+    assert done.wait(5)
+    assert results == [4]
+    assert isinstance(errors[0], ValueError)
+
+    stats = scheduler.stats()
+    assert stats['low']['completed'] >= 1
+    assert stats['high']['completed'] == 1
+    assert stats['high']['waitMs']['max'] >= 0
+    scheduler.terminate()
+
+
+def test_queued_tasks_are_reported():
+    queued = []
+    scheduler = Scheduler(
+        1,
+        {'own': Lane(0, 1, dedicated=True)},
+        'own',
+        on_queued=lambda *args: queued.append(args),
+    )
+    blocker = Event()
+
+    def task(name):
+        pass
+
+    scheduler.submit('own', blocker.wait)
+    scheduler.submit('own', task, 'second')
+    scheduler.submit('own', task, 'third')
+    blocker.set()
+    scheduler.terminate()
+
+    assert queued == [('own', task, ('second',), 1), ('own', task, ('third',), 2)]
+
+
+def test_reserved_worker_serves_queries():
+    server = Server()
+    scheduler = Scheduler(server.workers, server.lanes, Server.LANE_INTERACTIVE)
+    blocker = Event()
+    for _ in range(server.workers):
+        scheduler.submit(Server.LANE_PARSE, blocker.wait)
+        scheduler.submit(Server.LANE_BACKGROUND, blocker.wait)
+
+    def running():
+        stats = scheduler.stats()
+        return sum(stats[lane]['running'] for lane in stats)
+
+    deadline = monotonic() + 5
+    while running() < server.workers - 1 and monotonic() < deadline:
+        sleep(0.01)
+    sleep(0.1)
+    assert running() == server.workers - 1
+
+    query = Event()
+    scheduler.submit(Server.LANE_INTERACTIVE, query.set)
+    assert query.wait(5)
+
+    blocker.set()
+    scheduler.terminate()
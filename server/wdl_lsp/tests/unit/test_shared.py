@@ -0,0 +1,96 @@
+from threading import Event
+
+from lsprotocol.types import TEXT_DOCUMENT_HOVER
+from pygls.workspace import Workspace
+
+from ...server import Server, _download, _parse_wdl, parse_wdl, server
+from .conftest import MAIN_WDL, FakeServer, doc_uri, set_line, set_text
+
+
+def test_client_shares_workspace_indexes():
+    client = Server(shared=server)
+
+    assert client.wdl_paths is server.wdl_paths
+    assert client.aborting_workflows is server.aborting_workflows
+    assert client.wdl_symbols is not server.wdl_symbols
+    assert client.loop is server.loop
+
+
+def test_client_features_are_bound_to_client():
+    client = Server(shared=server)
+
+    handler = client.lsp.fm.features[TEXT_DOCUMENT_HOVER]
+    assert handler.args[0] is client
+    assert client.lsp.fm.commands.keys() == server.lsp.fm.commands.keys()
+    assert client.lsp.fm.feature_options == server.lsp.fm.feature_options
+
+
+def test_disconnect_cancels_pending_parses():
+    client = Server(shared=server)
+    server.clients.add(client)
+    parse_wdl(client, 'file:///main.wdl')
+    assert (client, 'file:///main.wdl') in getattr(parse_wdl, 'timers')
+
+    client.disconnect()
+    assert client not in server.clients
+    assert not any(id[0] is client for id in getattr(parse_wdl, 'timers'))
+
+
+def test_parse_timer_is_removed_when_fired(monkeypatch):
+    client = Server(shared=server)
+    parsed = Event()
+    monkeypatch.setattr(client.scheduler, 'submit', lambda *args: parsed.set())
+    parse_wdl(client, 'file:///main.wdl')
+
+    assert parsed.wait(5)
+    assert (client, 'file:///main.wdl') not in getattr(parse_wdl, 'timers')
+
+
+def test_clients_share_parses_of_saved_files(server):
+    client = FakeServer(server.workspace, shared=server)
+    uri = doc_uri(server, 'main.wdl')
+
+    _, wdl = _parse_wdl(server, uri)
+    assert wdl
+    assert _parse_wdl(client, uri)[1] is wdl
+    assert client.wdl_symbols[uri] is server.wdl_symbols[uri]
+
+
+def test_unsaved_edits_are_parsed_per_client(server):
+    uri = doc_uri(server, 'main.wdl')
+    _, wdl = _parse_wdl(server, uri)
+
+    workspace = Workspace(server.workspace.root_uri)
+    client = FakeServer(workspace, shared=server)
+    set_text(client, uri, MAIN_WDL.replace('samples', 'inputs'))
+    _, edited = _parse_wdl(client, uri)
+    assert edited is not wdl
+    assert server.wdl_parses[uri].doc is wdl
+
+    set_line(server, doc_uri(server, 'lib.wdl'), 10, '    Int threads = 8\n')
+    _, edited = _parse_wdl(server, uri)
+    assert server.wdl_parses[uri].doc is wdl
+
+
+def test_helper_errors_are_reported_to_client(server, monkeypatch):
+    client = FakeServer(server.workspace, shared=server)
+    messages = []
+    client.show_message_log = lambda message, *args: messages.append(message)
+
+    def download(url):
+        raise OSError('unreachable ' + url)
+
+    monkeypatch.setattr('wdl_lsp.server.download', download)
+    assert _download(client, 'gs://bucket/stderr') is None
+    assert messages == ['unreachable gs://bucket/stderr']
+
+
+def test_queued_runs_are_reported_to_client():
+    client = Server(shared=server)
+    messages = []
+    client.show_message = lambda message, *args: messages.append(message)
+
+    handler = client.lsp.fm.commands[Server.CMD_RUN_WDL]
+    server._on_queued(Server.LANE_CROMWELL, handler, ([],), 2)
+    server._on_queued(Server.LANE_PARSE, handler, ([],), 2)
+    assert messages == ['Workflow run is queued behind 2 other run(s), 4 run at once']
@@ -0,0 +1,104 @@
+from os import utime
+
+from lsprotocol.types import (DidChangeWatchedFilesParams, FileChangeType,
+                              FileEvent)
+
+from ...server import _parse_wdl, did_change_watched_files
+from .conftest import LIB_WDL, doc_uri
+
+
+def _watched(ls, uri, type):
+    did_change_watched_files(ls, DidChangeWatchedFilesParams([FileEvent(uri, type)]))
+
+
+def test_imports_are_cached(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+
+    _, wdl = _parse_wdl(disk_server, uri)
+    assert wdl
+    imports = dict(disk_server.wdl_imports)
+    assert imports[('lib.wdl', 'file://' + str(tmp_path))] == str(tmp_path / 'lib.wdl')
+
+    _parse_wdl(disk_server, uri)
+    assert disk_server.wdl_imports == imports
+
+
+def test_imports_invalidated_by_name(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+    _parse_wdl(disk_server, uri)
+
+    _watched(disk_server, doc_uri(disk_server, 'other.wdl'), FileChangeType.Created)
+    assert ('lib.wdl', 'file://' + str(tmp_path)) in disk_server.wdl_imports
+
+    (tmp_path / 'lib.wdl').unlink()
+    _watched(disk_server, doc_uri(disk_server, 'lib.wdl'), FileChangeType.Deleted)
+    assert ('lib.wdl', 'file://' + str(tmp_path)) not in disk_server.wdl_imports
+
+    diagnostics, wdl = _parse_wdl(disk_server, uri)
+    assert wdl is None
+    assert ('lib.wdl', 'file://' + str(tmp_path)) not in disk_server.wdl_imports
+
+
+def test_imports_resolved_without_watched_files(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+    _parse_wdl(disk_server, uri)
+
+    # deleted and created files are found again, even if no event is sent
+    (tmp_path / 'lib.wdl').unlink()
+    _, wdl = _parse_wdl(disk_server, uri)
+    assert wdl is None
+
+    (tmp_path / 'lib.wdl').write_text(LIB_WDL)
+    _, wdl = _parse_wdl(disk_server, uri)
+    assert wdl
+
+
+def test_sources_revalidated_on_change(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+    _parse_wdl(disk_server, uri)
+
+    lib_path = str(tmp_path / 'lib.wdl')
+    assert disk_server.wdl_sources[lib_path][1] == LIB_WDL
+
+    (tmp_path / 'lib.wdl').write_text(LIB_WDL.replace('Int threads = 4', 'Int threads = 8'))
+    _, wdl = _parse_wdl(disk_server, uri)
+    assert wdl
+    assert 'Int threads = 8' in disk_server.wdl_sources[lib_path][1]
+
+
+def test_recent_rewrite_of_same_size(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+    _parse_wdl(disk_server, uri)
+
+    lib = tmp_path / 'lib.wdl'
+    mtime_ns = lib.stat().st_mtime_ns
+    lib.write_text(LIB_WDL.replace('Int threads = 4', 'Int threads = 8'))
+    utime(lib, ns=(mtime_ns, mtime_ns))
+    _, wdl = _parse_wdl(disk_server, uri)
+    assert 'Int threads = 8' in wdl.imports[0].doc.source_text
+
+
+def test_deleted_files_are_evicted(disk_server, tmp_path):
+    uri = doc_uri(disk_server, 'main.wdl')
+    _parse_wdl(disk_server, uri)
+    assert uri in disk_server.wdl_parses
+    assert str(tmp_path / 'main.wdl') in disk_server.wdl_sources
+
+    (tmp_path / 'main.wdl').unlink()
+    _watched(disk_server, uri, FileChangeType.Deleted)
+    assert uri not in disk_server.wdl_parses
+    assert str(tmp_path / 'main.wdl') not in disk_server.wdl_sources
+
+
+def test_parse_cache_is_bounded(disk_server, tmp_path, monkeypatch):
+    monkeypatch.setattr('wdl_lsp.server.PARSE_CACHE_SIZE', 2)
+    for name in ['a.wdl', 'b.wdl']:
+        (tmp_path / name).write_text(LIB_WDL)
+    for name in ['a.wdl', 'main.wdl', 'b.wdl']:
+        _parse_wdl(disk_server, doc_uri(disk_server, name))
+    _parse_wdl(disk_server, doc_uri(disk_server, 'a.wdl'))
+
+    assert list(disk_server.wdl_parses) == [
+        doc_uri(disk_server, 'b.wdl'),
+        doc_uri(disk_server, 'a.wdl'),
+    ]